@@ -0,0 +1,38 @@
+import hashlib
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from api.cache import CacheStats, cache_is_shared, get_cache
+
+token_stats = CacheStats('tokens')
+
+
+def token_cache_key(key):
+    return f'api:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(keys):
+    get_cache().delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        if not settings.AUTH_TOKEN_CACHE_TTL or not cache_is_shared():
+            return super().authenticate_credentials(key)
+        cache = get_cache()
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        token_stats.record(user is not None)
+        if user is not None:
+            if not user.is_active:
+                cache.delete(cache_key)
+                raise exceptions.AuthenticationFailed(
+                    _('User inactive or deleted.')
+                )
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, user, settings.AUTH_TOKEN_CACHE_TTL)
+        return user, token
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from recipes.models import CacheVersion
+
+logger = logging.getLogger('foodgram.cache')
+
+
+def get_cache():
+    return caches[settings.API_CACHE_ALIAS]
+
+
+def cache_is_shared():
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+class CacheStats:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            total = self.hits + self.misses
+        interval = settings.CACHE_STATS_LOG_INTERVAL
+        if interval and total % interval == 0:
+            logger.info(json.dumps(self.snapshot()))
+
+    def snapshot(self):
+        total = self.hits + self.misses
+        return {
+            'cache': self.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+        }
+
+
+def get_versions(namespaces):
+    versions = dict(
+        CacheVersion.objects.filter(namespace__in=namespaces).values_list(
+            'namespace', 'version'
+        )
+    )
+    missing = [
+        namespace for namespace in namespaces if namespace not in versions
+    ]
+    if missing:
+        now = time.time()
+        CacheVersion.objects.bulk_create(
+            (
+                CacheVersion(namespace=namespace, version=now)
+                for namespace in missing
+            ),
+            ignore_conflicts=True,
+        )
+        versions.update(
+            CacheVersion.objects.filter(namespace__in=missing).values_list(
+                'namespace', 'version'
+            )
+        )
+    return versions
+
+
+def user_namespace(user_id):
+    return f'user:{user_id}'
+
+
+def bump_version(namespace):
+    transaction.on_commit(lambda: store_version(namespace))
+
+
+def store_version(namespace):
+    now = time.time()
+    versions = CacheVersion.objects.filter(namespace=namespace)
+    version = Greatest(F('version') + 0.000001, Value(now))
+    if not versions.update(version=version):
+        CacheVersion.objects.bulk_create(
+            (CacheVersion(namespace=namespace, version=now),),
+            ignore_conflicts=True,
+        )
+        versions.update(version=version)
+
+
+response_stats = CacheStats('responses')
+
+
+class CachedResponseMixin:
+    cache_namespaces = ()
+    detail_namespaces = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def get_version_namespaces(self, request):
+        namespaces = self.cache_namespaces
+        if self.detail and self.detail_namespaces is not None:
+            namespaces = self.detail_namespaces
+        if request.user.is_authenticated:
+            namespaces = (*namespaces, user_namespace(request.user.pk))
+        return namespaces
+
+    def get_last_modified(self, request, **kwargs):
+        return None
+
+    def get_digest(self, request, versions, modified):
+        material = json.dumps(
+            (
+                request.build_absolute_uri(request.path),
+                sorted(request.query_params.lists()),
+                request.accepted_renderer.format,
+                request.user.pk,
+                sorted(versions.items()),
+                modified,
+            )
+        )
+        return hashlib.sha1(material.encode()).hexdigest()
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        versions = get_versions(self.get_version_namespaces(request))
+        modified = self.get_last_modified(request, **kwargs)
+        digest = self.get_digest(request, versions, modified)
+        etag = quote_etag(digest)
+        stamps = list(versions.values())
+        if modified is not None:
+            stamps.append(modified)
+        last_modified = None
+        if stamps and time.time() - max(stamps) >= 1:
+            last_modified = int(max(stamps))
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = self.cached_handler(
+                handler, request, digest, *args, **kwargs
+            )
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def cached_handler(self, handler, request, digest, *args, **kwargs):
+        if request.user.is_authenticated or not settings.API_CACHE_TIMEOUT:
+            return handler(request, *args, **kwargs)
+        cache = get_cache()
+        key = f'api:response:{self.basename}:{digest}'
+        data = cache.get(key)
+        response_stats.record(data is not None)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, settings.API_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -1,6 +1,31 @@
 import django_filters
+from django import forms
+from django.db.models import Count
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, RecipeTag
+from recipes.search import search_recipes
+from recipes.tag_cache import tag_slug_cache
+
+TAGS_MODE_ALL = 'all'
+TAGS_MODE_ANY = 'any'
+TAGS_MODES = (
+    (TAGS_MODE_ALL, 'Все выбранные теги'),
+    (TAGS_MODE_ANY, 'Любой из выбранных тегов'),
+)
+
+
+class SlugListField(forms.Field):
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        if not value:
+            return []
+        return [str(slug) for slug in value]
+
+
+class SlugListFilter(django_filters.Filter):
+    field_class = SlugListField
 
 
 class FavoriteShoppingFilter(django_filters.FilterSet):
@@ -8,10 +33,9 @@ class FavoriteShoppingFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
-    tags = django_filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        to_field_name='slug',
-        method='filter_tags',
+    tags = SlugListFilter(method='filter_tags')
+    tags_mode = django_filters.ChoiceFilter(
+        choices=TAGS_MODES, method='filter_tags_mode'
     )
     author = django_filters.NumberFilter(method='filter_author')
 
@@ -31,10 +55,25 @@ class FavoriteShoppingFilter(django_filters.FilterSet):
         return self._filter(queryset, field, value, filtered)
 
     def filter_tags(self, queryset, field, value):
-        filtered = queryset
-        for tag in value:
-            filtered = filtered.filter(tags=tag)
-        return self._filter(queryset, field, value, filtered)
+        if not value:
+            return queryset
+        slugs = set(value)
+        tag_ids = tag_slug_cache.get_ids(slugs)
+        recipe_tags = RecipeTag.objects.filter(tag_id__in=tag_ids)
+        if self.form.cleaned_data.get('tags_mode') == TAGS_MODE_ANY:
+            return queryset.filter(pk__in=recipe_tags.values('recipe_id'))
+        if len(tag_ids) < len(slugs):
+            return queryset.none()
+        matching = (
+            recipe_tags.values('recipe_id')
+            .annotate(matched=Count('tag_id'))
+            .filter(matched=len(tag_ids))
+            .values('recipe_id')
+        )
+        return queryset.filter(pk__in=matching)
+
+    def filter_tags_mode(self, queryset, field, value):
+        return queryset
 
     def filter_author(self, queryset, field, value):
         filtered = queryset.filter(author__id=value)
@@ -42,7 +81,23 @@ class FavoriteShoppingFilter(django_filters.FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'tags', 'author')
+        fields = (
+            'is_favorited',
+            'is_in_shopping_cart',
+            'tags',
+            'tags_mode',
+            'author',
+        )
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_recipes(queryset, query)
 
 
 class IngredientFilter(django_filters.FilterSet):
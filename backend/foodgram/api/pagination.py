@@ -0,0 +1,131 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    feed_query_param = 'feed'
+    cursor_query_param = 'cursor'
+    feed_orderings = {}
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_feed(self, request):
+        return request.query_params.get(self.feed_query_param)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.feed = self.get_feed(request)
+        if self.feed is None:
+            return super().paginate_queryset(queryset, request, view)
+        if self.feed not in self.feed_orderings:
+            raise NotFound(f'Неизвестная лента: {self.feed}')
+        self.request = request
+        self.ordering = self.feed_orderings[self.feed]
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        results = list(queryset[: page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            self.next_position = [
+                self.position_value(results[-1], field)
+                for field in self.ordering
+            ]
+        return results
+
+    def position_value(self, instance, field):
+        value = getattr(instance, field.lstrip('-'))
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def keyset_filter(self, position):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def ordering_field(self, queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        for field, value in zip(self.ordering, position):
+            try:
+                value = self.ordering_field(
+                    queryset, field.lstrip('-')
+                ).to_python(value)
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, position):
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode())
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            encoded.decode(),
+        )
+
+    def get_next_link(self):
+        if self.feed is None:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        if self.feed is None:
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ('next', self.get_next_link()),
+                    ('previous', None),
+                    ('results', data),
+                ]
+            )
+        )
+
+
+class RecipePagination(KeysetPagination):
+    feed_orderings = {
+        'latest': ('-pub_date', '-id'),
+        'popular': ('-favorites_count', '-pub_date', '-id'),
+    }
+
+
+class TimelinePagination(KeysetPagination):
+    feed_orderings = {'timeline': ('-feed_pub_date', '-id')}
+
+    def get_feed(self, request):
+        return 'timeline'
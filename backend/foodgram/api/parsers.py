@@ -0,0 +1,29 @@
+import io
+
+from django.conf import settings
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+
+
+class RequestTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Слишком большое тело запроса'
+    default_code = 'request_too_large'
+
+
+class LimitedJSONParser(JSONParser):
+    def parse(self, stream, media_type=None, parser_context=None):
+        limit = settings.DATA_UPLOAD_MAX_MEMORY_SIZE
+        request = (parser_context or {}).get('request')
+        if limit is not None:
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except (AttributeError, ValueError):
+                content_length = 0
+            if content_length > limit:
+                raise RequestTooLarge
+            body = stream.read(limit + 1)
+            if len(body) > limit:
+                raise RequestTooLarge
+            stream = io.BytesIO(body)
+        return super().parse(stream, media_type, parser_context)
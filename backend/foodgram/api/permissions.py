@@ -45,3 +45,8 @@ class GetPostOnly(permissions.BasePermission):
 
     def has_permission(self, request, view):
         return request.method in self.follow_methods
+
+
+class AdminOnly(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_admin
@@ -0,0 +1,193 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+
+    def stream(self, records):
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    charset = 'utf-8'
+    title = ('Foodgram', 'Shopping list')
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, rows):
+        raise NotImplementedError('.stream() must be implemented.')
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for line in self.title:
+            yield f'{line}\n'
+        for row in rows:
+            yield f'{row.name} - {row.amount} {row.measurement_unit}\n'
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow(
+                (row.name, row.measurement_unit, row.amount)
+            )
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for row in rows:
+            yield separator + json.dumps(row._asdict(), ensure_ascii=False)
+            separator = ','
+        yield ']' if separator == ',' else '[]'
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    encoding = 'cp1251'
+    cyrillic_glyphs = (
+        [(168, 'afii10023'), (184, 'afii10071')]
+        + [(192 + i, f'afii{10017 + i}') for i in range(6)]
+        + [(198 + i, f'afii{10024 + i}') for i in range(26)]
+        + [(224 + i, f'afii{10065 + i}') for i in range(6)]
+        + [(230 + i, f'afii{10072 + i}') for i in range(26)]
+    )
+
+    def _escape(self, line):
+        data = line.encode(self.encoding, errors='replace')
+        return (
+            data.replace(b'\\', b'\\\\')
+            .replace(b'(', b'\\(')
+            .replace(b')', b'\\)')
+        )
+
+    def _page_content(self, lines):
+        top = PDF_PAGE_HEIGHT - PDF_MARGIN
+        content = [
+            b'BT',
+            b'/F1 %d Tf' % PDF_FONT_SIZE,
+            b'%d TL' % PDF_LEADING,
+            b'%d %d Td' % (PDF_MARGIN, top),
+        ]
+        content.extend(b'(%s) Tj T*' % self._escape(line) for line in lines)
+        content.append(b'ET')
+        return b'\n'.join(content)
+
+    def _pages(self, rows):
+        page = list(self.title) + ['']
+        for row in rows:
+            page.append(f'{row.name} - {row.amount} {row.measurement_unit}')
+            if len(page) == PDF_LINES_PER_PAGE:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def stream(self, rows):
+        offsets = {}
+        position = 0
+        kids = []
+
+        def write_object(number, body):
+            nonlocal position
+            offsets[number] = position
+            chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+            position += len(chunk)
+            return chunk
+
+        header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        position = len(header)
+        yield header
+        yield write_object(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        differences = b' '.join(
+            b'%d /%s' % (code, name.encode())
+            for code, name in self.cyrillic_glyphs
+        )
+        yield write_object(
+            3,
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+            b'/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            b'/Differences [%s] >> >>' % differences,
+        )
+        number = 3
+        for lines in self._pages(rows):
+            content = self._page_content(lines)
+            number += 1
+            yield write_object(
+                number,
+                b'<< /Length %d >>\nstream\n%s\nendstream'
+                % (len(content), content),
+            )
+            number += 1
+            kids.append(number)
+            yield write_object(
+                number,
+                b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+                b'/Resources << /Font << /F1 3 0 R >> >> '
+                b'/Contents %d 0 R >>'
+                % (PDF_PAGE_WIDTH, PDF_PAGE_HEIGHT, number - 1),
+            )
+        yield write_object(
+            2,
+            b'<< /Type /Pages /Kids [%s] /Count %d >>'
+            % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)),
+        )
+        xref = [b'xref', b'0 %d' % (number + 1), b'0000000000 65535 f ']
+        xref.extend(
+            b'%010d 00000 n ' % offsets[object_number]
+            for object_number in range(1, number + 1)
+        )
+        xref.extend(
+            (
+                b'trailer',
+                b'<< /Size %d /Root 1 0 R >>' % (number + 1),
+                b'startxref',
+                b'%d' % position,
+                b'%%EOF',
+            )
+        )
+        yield b'\n'.join(xref) + b'\n'
+
+
+SHOPPING_CART_RENDERERS = (
+    ShoppingCartTextRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartJSONRenderer,
+    ShoppingCartPDFRenderer,
+)
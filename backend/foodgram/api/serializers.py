@@ -1,13 +1,15 @@
-import base64
-
+from django.conf import settings
 from django.contrib.auth.hashers import make_password
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
+from api.uploads import LimitedImageField, decode_base64_image
+from recipes.images import IMAGE_VARIANTS, needs_variants
 from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
-from users.models import Follow, User
+from recipes.shopping_cart import apply_recipe_deltas
+from users.models import User
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -32,9 +34,11 @@ class UserSerializer(serializers.ModelSerializer):
             user = self.context['request'].user
         except KeyError:
             return None
-        if user.is_authenticated:
-            return user.follower.filter(author=instance).exists()
-        return None
+        if not user.is_authenticated:
+            return None
+        if hasattr(instance, 'is_subscribed'):
+            return instance.is_subscribed
+        return user.follower.filter(author=instance).exists()
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -55,28 +59,22 @@ class IngredientSerializer(serializers.ModelSerializer):
             'measurement_unit',
         )
 
-    def serialize_ingredient(self, ingredient):
-        try:
-            recipe = self.context['recipe_instance']
-        except KeyError:
-            return {}
-        recipe_ingredient = ingredient.recipeingredient.filter(
-            recipe=recipe
-        ).first()
-        return RecipeIngredientSerializer(recipe_ingredient).data
-
-    def to_representation(self, instance):
-        rep = super().to_representation(instance)
-        return {**rep, **self.serialize_ingredient(instance)}
-
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+
     class Meta:
         model = RecipeIngredient
-        fields = ('amount',)
-
-    def validate(self, attrs):
-        return super().validate(attrs)
+        fields = (
+            'id',
+            'name',
+            'measurement_unit',
+            'amount',
+        )
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -85,15 +83,48 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
+def recipe_prefetches():
+    return (
+        Prefetch('tags', queryset=Tag.objects.all()),
+        Prefetch(
+            'recipeingredient',
+            queryset=RecipeIngredient.objects.filter(
+                ingredient__isnull=False
+            )
+            .select_related('ingredient')
+            .order_by('ingredient__name'),
+        ),
+    )
+
+
 class Base64ImageField(serializers.ImageField):
+    def __init__(self, **kwargs):
+        kwargs.setdefault('_DjangoImageField', LimitedImageField)
+        super().__init__(**kwargs)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = decode_base64_image(data)
         return super().to_internal_value(data)
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        if not recipe.image:
+            return None
+        request = self.context.get('request')
+        stale = needs_variants(recipe)
+        urls = {}
+        for variant, field, _ in IMAGE_VARIANTS:
+            url = (recipe.image if stale else getattr(recipe, field)).url
+            urls[variant] = request.build_absolute_uri(url) if request else url
+        return urls
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     tags = serializers.SerializerMethodField(source='get_tags')
     author = UserSerializer(required=False, read_only=True)
@@ -101,6 +132,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField(
         required=True,
     )
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField(
         source='get_is_favorite', default=False
     )
@@ -110,72 +142,137 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     def to_internal_value(self, data):
         input_data = super(RecipeSerializer, self).to_internal_value(data)
-        tags = []
-        for tag in data['tags']:
-            tags.append(
-                TagSerializer(Tag.objects.filter(id=tag), many=True).data[0]
-            )
-        input_data['tags'] = tags
-        input_data['ingredients'] = data['ingredients']
+        errors = {}
+        for field, validate in (
+            ('tags', self.validate_tag_ids),
+            ('ingredients', self.validate_ingredient_amounts),
+        ):
+            if field not in data and self.partial:
+                continue
+            try:
+                input_data[field] = validate(data.get(field))
+            except serializers.ValidationError as error:
+                errors[field] = error.detail
+        if errors:
+            raise serializers.ValidationError(errors)
         return input_data
 
+    def validate_tag_ids(self, tag_ids):
+        if not isinstance(tag_ids, list):
+            raise serializers.ValidationError('Передайте список id тегов')
+        try:
+            tag_ids = [int(tag_id) for tag_id in tag_ids]
+        except (TypeError, ValueError):
+            raise serializers.ValidationError('id тега должен быть числом')
+        if len(set(tag_ids)) != len(tag_ids):
+            raise serializers.ValidationError('Теги не должны повторяться')
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = [tag_id for tag_id in tag_ids if tag_id not in tags]
+        if missing:
+            raise serializers.ValidationError(f'Теги не найдены: {missing}')
+        return [tags[tag_id] for tag_id in tag_ids]
+
+    def validate_ingredient_amounts(self, ingredients):
+        if not isinstance(ingredients, list):
+            raise serializers.ValidationError('Передайте список ингредиентов')
+        amounts = {}
+        for ingredient in ingredients:
+            try:
+                ingredient_id = int(ingredient['id'])
+                amount = int(ingredient['amount'])
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError(
+                    'Укажите id и количество ингредиента'
+                )
+            if amount < 1:
+                raise serializers.ValidationError(
+                    'Количество ингредиента должно быть не меньше 1'
+                )
+            if ingredient_id in amounts:
+                raise serializers.ValidationError(
+                    'Ингредиенты не должны повторяться'
+                )
+            amounts[ingredient_id] = amount
+        found = Ingredient.objects.in_bulk(list(amounts))
+        missing = [pk for pk in amounts if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {missing}'
+            )
+        return amounts
+
     def get_ingredients(self, recipe):
-        return IngredientSerializer(
-            recipe.ingredients.all(),
-            context={'recipe_instance': recipe},
-            many=True,
+        return RecipeIngredientSerializer(
+            recipe.recipeingredient.all(), many=True
         ).data
 
     def get_tags(self, recipe):
-        tags = []
-        for tag in recipe.tags.all():
-            tags.append(TagSerializer(tag).data)
-        return tags
+        return TagSerializer(recipe.tags.all(), many=True).data
 
     def create(self, validated_data):
         request = self.context.get('request', None)
         validated_data['author'] = request.user
         tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe_ingredients = []
-        recipe_tags = []
-        for ingredient in ingredients:
-            amount = ingredient['amount']
-            current_ingredient = get_object_or_404(
-                Ingredient, id=ingredient['id']
-            )
-            recipe_ingredients.append(
+        amounts = validated_data.pop('ingredients')
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            RecipeIngredient.objects.bulk_create(
                 RecipeIngredient(
-                    ingredient=current_ingredient, recipe=recipe, amount=amount
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
                 )
+                for ingredient_id, amount in amounts.items()
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag) for tag in tags
             )
-        RecipeIngredient.objects.bulk_create(recipe_ingredients)
-        for tag in tags:
-            current_tag = get_object_or_404(Tag, id=tag['id'])
-            recipe_tags.append(RecipeTag(tag=current_tag, recipe=recipe))
-        RecipeTag.objects.bulk_create(recipe_tags)
         return recipe
 
     def update(self, instance, validated_data):
         data = validated_data.copy()
-        tags = data.pop('tags')
-        ingredients = data.pop('ingredients')
+        tags = data.pop('tags', None)
+        amounts = data.pop('ingredients', None)
         for field, value in data.items():
             setattr(instance, field, value)
-        instance.save()
-        update_tags = [tag['id'] for tag in tags]
-        instance.tags.set(update_tags)
-        update_ingredients = [ingredient['id'] for ingredient in ingredients]
-        instance.ingredients.set(update_ingredients)
-        for ingredient in ingredients:
-            current_ingredient = instance.recipeingredient.filter(
-                recipe=instance, ingredient=ingredient['id']
-            ).first()
-            current_ingredient.amount = ingredient.get('amount')
-            current_ingredient.save()
+        with transaction.atomic():
+            instance.save(update_fields=(*data, 'updated_at'))
+            if tags is not None:
+                instance.tags.set(tags)
+            if amounts is not None:
+                self.update_ingredients(instance, amounts)
         return instance
 
+    def update_ingredients(self, recipe, amounts):
+        existing = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        changed = []
+        deltas = {}
+        for ingredient_id, amount in amounts.items():
+            row = existing.get(ingredient_id)
+            if row is None:
+                deltas[ingredient_id] = amount
+            elif row.amount != amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        removed = []
+        for ingredient_id, row in existing.items():
+            if ingredient_id not in amounts:
+                removed.append(row.pk)
+                deltas[ingredient_id] = -row.amount
+        if removed:
+            RecipeIngredient.objects.filter(pk__in=removed).delete()
+        apply_recipe_deltas(recipe, deltas)
+
     def get_is_favorited(self, recipe):
         try:
             user = self.context['request'].user
@@ -183,6 +280,8 @@ class RecipeSerializer(serializers.ModelSerializer):
                 return None
         except KeyError:
             return None
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         return recipe.favorite.filter(user=user, recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
@@ -192,8 +291,15 @@ class RecipeSerializer(serializers.ModelSerializer):
                 return None
         except KeyError:
             return None
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         return recipe.shopping.filter(user=user, recipe=recipe).exists()
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     class Meta:
         model = Recipe
         fields = (
@@ -203,6 +309,7 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
             'is_favorited',
@@ -210,44 +317,33 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
 
-class FollowSerializer(serializers.ModelSerializer):
-    author = UserSerializer(required=False)
-    recipes = serializers.SerializerMethodField(source='get_recipes')
-    recipes_count = serializers.SerializerMethodField(
-        source='get_recipes_count'
-    )
+class FavoriteOrShoppingSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
 
     class Meta:
-        fields = ('author', 'recipes', 'recipes_count')
-        model = Follow
-
-    def get_recipes(self, user):
-        recipes = RecipeSerializer(
-            user.author.recipe.filter(author=user.author),
-            context={'request': self.context['request']},
-            many=True,
-        ).data
-        for recipe in recipes:
-            for field in ['tags', 'author', 'ingredients', 'text']:
-                recipe.pop(field)
-        return recipes
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
-    def get_recipes_count(self, user):
-        return user.author.recipe.filter(author=user.author).count()
 
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        recipes = data.pop('recipes')
-        recipes_count = data.pop('recipes_count')
-        data['author']['recipes'] = recipes
-        data['author']['recipes_count'] = recipes_count
-        return data['author']
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BATCH_LIMIT,
+    )
 
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
 
-class FavoriteOrShoppingSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+
+class SubscriptionSerializer(UserSerializer):
+    recipes = FavoriteOrShoppingSerializer(
+        source='latest_recipes', many=True, read_only=True
+    )
+    recipes_count = serializers.ReadOnlyField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ('recipes', 'recipes_count')
 
 
 class UserPasswordSerializer(serializers.Serializer):
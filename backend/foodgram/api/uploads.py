@@ -0,0 +1,98 @@
+import base64
+import binascii
+from tempfile import SpooledTemporaryFile
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from PIL import Image
+
+BASE64_MARKER = ';base64,'
+BASE64_CHUNK_SIZE = 64 * 1024
+MULTIPART_OVERHEAD = 64 * 1024
+
+INVALID_BASE64 = 'Неверный формат изображения в base64'
+TOO_LARGE = 'Размер изображения не должен превышать {} МБ'
+TOO_MANY_PIXELS = 'Разрешение изображения не должно превышать {} Мпикс'
+
+
+def too_large_message():
+    return TOO_LARGE.format(settings.IMAGE_UPLOAD_MAX_BYTES // 1024 ** 2)
+
+
+def decode_base64_image(data):
+    marker = data.find(BASE64_MARKER, 0, 100)
+    if marker == -1:
+        raise ValidationError(INVALID_BASE64)
+    extension = data[:marker].split('/')[-1]
+    start = marker + len(BASE64_MARKER)
+    if (len(data) - start) // 4 * 3 > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ValidationError(too_large_message())
+    file = SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    try:
+        for position in range(start, len(data), BASE64_CHUNK_SIZE):
+            file.write(
+                base64.b64decode(
+                    data[position : position + BASE64_CHUNK_SIZE],
+                    validate=True,
+                )
+            )
+    except (binascii.Error, ValueError):
+        file.close()
+        raise ValidationError(INVALID_BASE64)
+    size = file.tell()
+    file.seek(0)
+    return UploadedFile(file, name=f'temp.{extension}', size=size)
+
+
+class LimitedImageField(forms.ImageField):
+    def to_python(self, data):
+        file = forms.FileField.to_python(self, data)
+        if file is None:
+            return None
+        if file.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise ValidationError(too_large_message())
+        file.seek(0)
+        try:
+            image = Image.open(file)
+        except Exception as error:
+            raise ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image'
+            ) from error
+        width, height = image.size
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise ValidationError(
+                TOO_MANY_PIXELS.format(
+                    settings.IMAGE_UPLOAD_MAX_PIXELS // 1000 ** 2
+                )
+            )
+        try:
+            image.verify()
+        except Exception as error:
+            raise ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image'
+            ) from error
+        file.image = image
+        file.content_type = Image.MIME.get(image.format)
+        file.seek(0)
+        return file
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        limit = settings.IMAGE_UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD
+        if content_length > limit:
+            raise MultiPartParserError(too_large_message())
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > settings.IMAGE_UPLOAD_MAX_BYTES:
+            raise MultiPartParserError(too_large_message())
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
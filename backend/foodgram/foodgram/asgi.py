@@ -0,0 +1,20 @@
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def closing_application(application):
+    def run(environ, start_response):
+        response = application(environ, start_response)
+        try:
+            yield from response
+        finally:
+            response.close()
+
+    return run
+
+
+application = WsgiToAsgi(closing_application(get_wsgi_application()))
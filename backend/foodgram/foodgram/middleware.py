@@ -0,0 +1,94 @@
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('foodgram.requests')
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.QUERY_INSTRUMENTATION_SAMPLE_RATE
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        view_time = (time.perf_counter() - started) * 1000
+        sql_time = recorder.duration * 1000
+        response['Server-Timing'] = ', '.join(
+            (
+                f'sql;dur={sql_time:.2f};desc="{recorder.count} queries, '
+                f'{recorder.duplicates} duplicates"',
+                f'view;dur={view_time:.2f}',
+            )
+        )
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view_ms': round(view_time, 2),
+            'sql_ms': round(sql_time, 2),
+            'sql_count': recorder.count,
+            'sql_duplicates': recorder.duplicates,
+        }
+        if recorder.duplicates:
+            sql, count = recorder.statements.most_common(1)[0]
+            record['most_repeated_sql'] = sql[:200]
+            record['most_repeated_count'] = count
+        logger.info(json.dumps(record, ensure_ascii=False))
+        return response
+
+
+class ConnectionHealthCheckMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.idle_interval = settings.DB_CONN_HEALTH_CHECK_IDLE
+
+    def __call__(self, request):
+        now = time.monotonic()
+        for connection in connections.all():
+            if connection.connection is None or connection.in_atomic_block:
+                continue
+            used_at = getattr(connection, 'health_check_used_at', None)
+            if used_at is not None and now - used_at < self.idle_interval:
+                continue
+            if not connection.is_usable():
+                connection.close()
+        try:
+            return self.get_response(request)
+        finally:
+            used_at = time.monotonic()
+            for connection in connections.all():
+                connection.health_check_used_at = used_at
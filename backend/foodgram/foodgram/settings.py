@@ -41,11 +41,27 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+QUERY_INSTRUMENTATION = (
+    os.getenv('QUERY_INSTRUMENTATION', default='False') == 'True'
+)
+
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(
+    os.getenv('QUERY_INSTRUMENTATION_SAMPLE_RATE', default='1.0')
+)
+
+if QUERY_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, 'foodgram.middleware.QueryInstrumentationMiddleware')
+
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'api.parsers.LimitedJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
     'PAGE_SIZE': 6,
 }
@@ -88,9 +104,77 @@ DATABASES = {
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default='60')),
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_PGBOUNCER', default='False') == 'True'
+        ),
     }
 }
 
+DB_CONN_HEALTH_CHECKS = (
+    os.getenv('DB_CONN_HEALTH_CHECKS', default='True') == 'True'
+)
+
+DB_CONN_HEALTH_CHECK_IDLE = int(
+    os.getenv('DB_CONN_HEALTH_CHECK_IDLE', default='30')
+)
+
+if DB_CONN_HEALTH_CHECKS and DATABASES['default']['CONN_MAX_AGE']:
+    MIDDLEWARE.insert(0, 'foodgram.middleware.ConnectionHealthCheckMiddleware')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram.requests': {
+            'handlers': ['console'],
+            'level': os.getenv('QUERY_INSTRUMENTATION_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'foodgram.cache': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'foodgram.workers': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': os.getenv(
+            'API_CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.getenv('API_CACHE_LOCATION', default='api'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(
+                os.getenv('API_CACHE_MAX_ENTRIES', default='1000')
+            ),
+        },
+    },
+}
+
+API_CACHE_ALIAS = 'api'
+
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', default='300'))
+
+CACHE_STATS_LOG_INTERVAL = int(
+    os.getenv('CACHE_STATS_LOG_INTERVAL', default='1000')
+)
+
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default='300'))
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -124,6 +208,50 @@ ADMIN = 'admin'
 
 USER = 'user'
 
+INGREDIENT_AUTOCOMPLETE_MAX_LIMIT = 100
+
+RECIPE_BATCH_LIMIT = int(os.getenv('RECIPE_BATCH_LIMIT', default='100'))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', default='300'))
+
+TAG_CACHE_TTL = int(os.getenv('TAG_CACHE_TTL', default='300'))
+
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default='2'))
+
+IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', default='82'))
+
+FEED_WORKERS = int(os.getenv('FEED_WORKERS', default='1'))
+
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', default='1000'))
+
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', default='1000'))
+
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', default='50'))
+
+FEED_PULL_INTERVAL = int(os.getenv('FEED_PULL_INTERVAL', default='60'))
+
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', default='10'))
+
+SIMILAR_TAG_WEIGHT = float(os.getenv('SIMILAR_TAG_WEIGHT', default='0.5'))
+
+SIMILAR_BLOCK_SIZE = int(os.getenv('SIMILAR_BLOCK_SIZE', default='128'))
+
+IMAGE_UPLOAD_MAX_BYTES = int(
+    os.getenv('IMAGE_UPLOAD_MAX_BYTES', default=str(10 * 1024 ** 2))
+)
+
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.getenv('IMAGE_UPLOAD_MAX_PIXELS', default=str(40 * 1000 ** 2))
+)
+
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_BYTES * 4 // 3 + 1024 ** 2
+
+FILE_UPLOAD_HANDLERS = (
+    'api.uploads.LimitedUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+
 STATIC_URL = '/static/'
 
 # STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static/'),)
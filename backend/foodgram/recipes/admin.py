@@ -9,6 +9,13 @@ from recipes.models import (
     ShoppingList,
     Tag,
 )
+from recipes.search import search_recipes
+from recipes.shopping_cart import (
+    add_to_carts,
+    apply_recipe_deltas,
+    recipe_amounts,
+    remove_from_carts,
+)
 
 
 class IngredientInline(admin.TabularInline):
@@ -51,7 +58,7 @@ class RecipeAdmin(admin.ModelAdmin):
         'image',
         'text',
         'cooking_time',
-        'in_favorites',
+        'favorites_count',
     )
     search_fields = ('name',)
     list_filter = ('name', 'author', 'tags')
@@ -61,8 +68,24 @@ class RecipeAdmin(admin.ModelAdmin):
         TagInline,
     )
 
-    def in_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
+    def save_related(self, request, form, formsets, change):
+        before = recipe_amounts([form.instance.pk]) if change else {}
+        super().save_related(request, form, formsets, change)
+        if change:
+            after = recipe_amounts([form.instance.pk])
+            apply_recipe_deltas(
+                form.instance,
+                {
+                    ingredient_id: after[ingredient_id]
+                    - before[ingredient_id]
+                    for ingredient_id in after.keys() | before.keys()
+                },
+            )
 
 
 class ShoppingAdmin(admin.ModelAdmin):
@@ -75,6 +98,14 @@ class ShoppingAdmin(admin.ModelAdmin):
     list_filter = ('user',)
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        if change and form.changed_data:
+            previous = ShoppingList.objects.get(pk=obj.pk)
+            remove_from_carts([previous.user_id], [previous.recipe_id])
+        super().save_model(request, obj, form, change)
+        if change and form.changed_data:
+            add_to_carts([obj.user_id], [obj.recipe_id])
+
 
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = (
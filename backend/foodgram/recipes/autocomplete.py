@@ -0,0 +1,45 @@
+import bisect
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from recipes.process_cache import ProcessCache
+
+
+class IngredientIndex(ProcessCache):
+    def load(self):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        return (
+            [row[0] for row in rows],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+                for _, pk, name, measurement_unit in rows
+            ],
+        )
+
+    def search(self, query, limit=None):
+        keys, entries = self.get()
+        query = query.casefold()
+        start = bisect.bisect_left(keys, query)
+        end = start
+        while end < len(keys) and (limit is None or end - start < limit):
+            if not keys[end].startswith(query):
+                break
+            end += 1
+        results = entries[start:end]
+        if limit is None or len(results) < limit:
+            for position, key in enumerate(keys):
+                if start <= position < end or query not in key:
+                    continue
+                results.append(entries[position])
+                if len(results) == limit:
+                    break
+        return results
+
+
+ingredient_index = IngredientIndex(settings.INGREDIENT_INDEX_TTL)
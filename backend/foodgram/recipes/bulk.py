@@ -0,0 +1,8 @@
+from django.db import connection
+
+
+def bulk_batch_size(model, size):
+    fields = model._meta.concrete_fields
+    return max(
+        min(size, connection.ops.bulk_batch_size(fields, range(size))), 1
+    )
@@ -0,0 +1,34 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingList
+from users.models import Follow, User
+
+COUNTERS = (
+    (Favorite, Recipe, 'recipe', 'favorites_count'),
+    (ShoppingList, Recipe, 'recipe', 'in_carts_count'),
+    (Recipe, User, 'author', 'recipes_count'),
+    (Follow, User, 'author', 'followers_count'),
+)
+
+
+def change_counter(queryset, field, delta):
+    queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+def rebuild_counters():
+    for model, target, field, counter in COUNTERS:
+        target.objects.update(**{counter: count_subquery(model, field)})
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db.models import Max
+
+from api.cache import get_cache
+from recipes.bulk import bulk_batch_size
+from recipes.models import FeedEntry, Recipe
+from recipes.workers import WorkerPool
+from users.models import Follow
+
+
+def pull_mode(followers_count):
+    return followers_count > settings.FEED_FANOUT_LIMIT
+
+
+def add_to_followers(author_id, recipe_id, pub_date):
+    followers = Follow.objects.filter(author_id=author_id).order_by('user_id')
+    last_user_id = 0
+    total = 0
+    while True:
+        user_ids = list(
+            followers.filter(user_id__gt=last_user_id).values_list(
+                'user_id', flat=True
+            )[: settings.FEED_BATCH_SIZE]
+        )
+        if not user_ids:
+            return total
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(
+                    user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+                )
+                for user_id in user_ids
+            ),
+            ignore_conflicts=True,
+        )
+        total += len(user_ids)
+        last_user_id = user_ids[-1]
+
+
+def fan_out(recipe_id):
+    recipe = (
+        Recipe.objects.filter(pk=recipe_id)
+        .values_list('author_id', 'pub_date', 'author__followers_count')
+        .first()
+    )
+    if recipe is None:
+        return 0
+    author_id, pub_date, followers_count = recipe
+    total = 0
+    if not pull_mode(followers_count):
+        total = add_to_followers(author_id, recipe_id, pub_date)
+    Recipe.objects.filter(pk=recipe_id).update(fanned_out=True)
+    return total
+
+
+def fan_out_pending():
+    recipe_ids = list(
+        Recipe.objects.filter(fanned_out=False)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    for recipe_id in recipe_ids:
+        fan_out(recipe_id)
+    return len(recipe_ids)
+
+
+feed_workers = WorkerPool('feed', settings.FEED_WORKERS, fan_out)
+
+
+def add_to_feed(user_id, recipes):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for recipe_id, pub_date in recipes
+        ),
+        ignore_conflicts=True,
+        batch_size=bulk_batch_size(FeedEntry, settings.FEED_BATCH_SIZE),
+    )
+
+
+def latest_recipes(author_id, since=None):
+    recipes = Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    )
+    if since is not None:
+        recipes = recipes.filter(pub_date__gt=since)
+    else:
+        recipes = recipes[: settings.FEED_BACKFILL]
+    return list(recipes.values_list('id', 'pub_date'))
+
+
+def follow_feed(user_id, author_ids):
+    recipes = []
+    for author_id in author_ids:
+        recipes.extend(latest_recipes(author_id))
+    add_to_feed(user_id, recipes)
+
+
+def unfollow_feed(user_id, author_ids):
+    FeedEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def pull_feed(user_id):
+    if not get_cache().add(
+        f'feed:pull:{user_id}', True, settings.FEED_PULL_INTERVAL
+    ):
+        return
+    author_ids = list(
+        Follow.objects.filter(
+            user_id=user_id,
+            author__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('author_id', flat=True)
+    )
+    if not author_ids:
+        return
+    synced = dict(
+        FeedEntry.objects.filter(
+            user_id=user_id, recipe__author_id__in=author_ids
+        )
+        .values('recipe__author_id')
+        .annotate(latest=Max('pub_date'))
+        .values_list('recipe__author_id', 'latest')
+    )
+    recipes = []
+    for author_id in author_ids:
+        recipes.extend(latest_recipes(author_id, synced.get(author_id)))
+    add_to_feed(user_id, recipes)
+
+
+def rebuild_feeds():
+    FeedEntry.objects.all().delete()
+    follows = Follow.objects.order_by('user_id').values_list(
+        'user_id', 'author_id'
+    )
+    user_id = None
+    author_ids = []
+    for follower_id, author_id in follows.iterator():
+        if follower_id != user_id and author_ids:
+            follow_feed(user_id, author_ids)
+            author_ids = []
+        user_id = follower_id
+        author_ids.append(author_id)
+    if author_ids:
+        follow_feed(user_id, author_ids)
+    Recipe.objects.filter(fanned_out=False).update(fanned_out=True)
@@ -0,0 +1,81 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image
+
+from api.cache import bump_version
+from recipes.models import Recipe
+from recipes.workers import WorkerPool
+
+IMAGE_VARIANTS = (
+    ('thumbnail', 'image_thumbnail', 160),
+    ('card', 'image_card', 480),
+    ('full', 'image_full', 1280),
+)
+VARIANT_FIELDS = tuple(field for _, field, _ in IMAGE_VARIANTS)
+
+
+def variant_prefix(image_name, variant):
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    return f'{stem}_{variant}'
+
+
+def needs_variants(recipe):
+    if not recipe.image:
+        return False
+    return any(
+        not os.path.basename(getattr(recipe, field).name or '').startswith(
+            variant_prefix(recipe.image.name, variant)
+        )
+        for variant, field, _ in IMAGE_VARIANTS
+    )
+
+
+def render_variant(source, size):
+    image = source.copy()
+    image.thumbnail((size, size), Image.LANCZOS)
+    if image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(
+        buffer,
+        'JPEG',
+        quality=settings.IMAGE_VARIANT_QUALITY,
+        optimize=True,
+        progressive=True,
+    )
+    return buffer.getvalue()
+
+
+def build_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not needs_variants(recipe):
+        return False
+    image_name = recipe.image.name
+    with recipe.image.open('rb') as file:
+        source = Image.open(file)
+        source.load()
+    updates = {}
+    for variant, field, size in IMAGE_VARIANTS:
+        variant_file = getattr(recipe, field)
+        variant_file.save(
+            f'{variant_prefix(image_name, variant)}.jpg',
+            ContentFile(render_variant(source, size)),
+            save=False,
+        )
+        updates[field] = variant_file.name
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        updated_at=timezone.now(), **updates
+    )
+    if updated:
+        bump_version('recipes')
+    return bool(updated)
+
+
+image_workers = WorkerPool('image', settings.IMAGE_WORKERS, build_variants)
@@ -0,0 +1,330 @@
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.counters import rebuild_counters
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShoppingList,
+    Tag,
+)
+from recipes.shopping_cart import rebuild_shopping_carts
+from users.models import Follow, User
+
+DEFAULT_INGREDIENTS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(settings.BASE_DIR)),
+    'data',
+    'ingredients.csv',
+)
+PREFIX = 'benchmark'
+
+
+class Rollback(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a synthetic dataset and measure latency, query count and '
+        'allocated memory of the hot API endpoints.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--cart', type=int, default=20)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--ingredients-file', default=DEFAULT_INGREDIENTS_FILE
+        )
+        parser.add_argument(
+            '--output', help='Write the results as JSON to this file.'
+        )
+        parser.add_argument(
+            '--compare', help='Previous JSON results to compare against.'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep the seeded data instead of rolling it back.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.random = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                self.seed()
+                with override_settings(ALLOWED_HOSTS=['testserver']):
+                    results = self.run()
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            pass
+        report = {
+            'meta': self.meta(),
+            'scale': {
+                key: options[key]
+                for key in (
+                    'users',
+                    'recipes',
+                    'ingredients_per_recipe',
+                    'follows',
+                    'favorites',
+                    'cart',
+                    'iterations',
+                )
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['compare']:
+            self.print_comparison(results, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def meta(self):
+        try:
+            commit = subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+        }
+
+    def load_ingredients(self):
+        path = self.options['ingredients_file']
+        if not os.path.exists(path):
+            raise CommandError(f'Ingredients file {path} not found')
+        with open(path, encoding='utf8') as file:
+            rows = [
+                Ingredient(name=name, measurement_unit=unit)
+                for name, unit in csv.reader(file)
+            ]
+        Ingredient.objects.bulk_create(rows, ignore_conflicts=True)
+        return list(Ingredient.objects.values_list('id', flat=True))
+
+    def seed(self):
+        options = self.options
+        started = time.perf_counter()
+        ingredient_ids = self.load_ingredients()
+        password = make_password(None)
+        User.objects.bulk_create(
+            User(
+                username=f'{PREFIX}{number}',
+                email=f'{PREFIX}{number}@example.com',
+                first_name='Benchmark',
+                last_name=str(number),
+                password=password,
+            )
+            for number in range(options['users'])
+        )
+        users = list(
+            User.objects.filter(username__startswith=PREFIX).order_by('id')
+        )
+        Tag.objects.bulk_create(
+            Tag(
+                name=f'{PREFIX}{number}',
+                slug=f'{PREFIX}{number}',
+                color='#000000',
+            )
+            for number in range(6)
+        )
+        tags = list(Tag.objects.filter(slug__startswith=PREFIX))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.random.choice(users),
+                name=f'{PREFIX} recipe {number}',
+                text='Benchmark recipe description',
+                cooking_time=self.random.randint(1, 120),
+                image='recipes/images/benchmark.png',
+            )
+            for number in range(options['recipes'])
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(name__startswith=PREFIX).values_list(
+                'id', flat=True
+            )
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in self.random.sample(
+                ingredient_ids,
+                min(options['ingredients_per_recipe'], len(ingredient_ids)),
+            )
+        )
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe_id=recipe_id, tag=tag)
+            for recipe_id in recipe_ids
+            for tag in self.random.sample(tags, 2)
+        )
+        for model, field, population, count in (
+            (Follow, 'author', users, options['follows']),
+            (Favorite, 'recipe_id', recipe_ids, options['favorites']),
+            (ShoppingList, 'recipe_id', recipe_ids, options['cart']),
+        ):
+            model.objects.bulk_create(
+                (
+                    model(user=user, **{field: target})
+                    for user in users
+                    for target in self.random.sample(
+                        population, min(count, len(population))
+                    )
+                    if target != user
+                ),
+                ignore_conflicts=True,
+            )
+        rebuild_counters()
+        rebuild_shopping_carts()
+        self.user = users[0]
+        self.token = Token.objects.create(user=self.user)
+        self.tags = tags
+        self.recipe_ids = recipe_ids
+        self.ingredient_names = list(
+            Ingredient.objects.values_list('name', flat=True)
+        )
+        self.stdout.write(
+            f'Seeded {len(users)} users and {len(recipe_ids)} recipes '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+
+    def endpoints(self):
+        tags = '&'.join(f'tags={tag.slug}' for tag in self.tags[:2])
+        last_page = max(
+            1, len(self.recipe_ids) // settings.REST_FRAMEWORK['PAGE_SIZE']
+        )
+        return (
+            ('recipes_list', lambda: '/api/recipes/'),
+            (
+                'recipes_list_filtered',
+                lambda: f'/api/recipes/?{tags}&is_favorited=0',
+            ),
+            (
+                'recipes_list_deep_page',
+                lambda: f'/api/recipes/?page={last_page}',
+            ),
+            (
+                'recipe_detail',
+                lambda: f'/api/recipes/{self.random.choice(self.recipe_ids)}/',
+            ),
+            ('subscriptions', lambda: '/api/users/subscriptions/'),
+            (
+                'ingredient_search',
+                lambda: '/api/ingredients/?name={}'.format(
+                    self.random.choice(self.ingredient_names)[:3]
+                ),
+            ),
+            (
+                'ingredient_keystroke',
+                lambda: '/api/ingredients/?name={}'.format(
+                    self.random.choice(self.ingredient_names)[
+                        : self.random.randint(1, 6)
+                    ]
+                ),
+            ),
+            (
+                'download_shopping_cart',
+                lambda: '/api/recipes/download_shopping_cart/',
+            ),
+        )
+
+    def request(self, client, url):
+        response = client.get(url, HTTP_AUTHORIZATION=f'Token {self.token}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f'GET {url} returned {response.status_code}')
+        return response
+
+    def run(self):
+        client = Client()
+        results = {}
+        for name, url in self.endpoints():
+            for _ in range(self.options['warmup']):
+                self.request(client, url())
+            timings = []
+            for _ in range(self.options['iterations']):
+                started = time.perf_counter()
+                self.request(client, url())
+                timings.append((time.perf_counter() - started) * 1000)
+            tracemalloc.start()
+            with CaptureQueriesContext(connection) as queries:
+                self.request(client, url())
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[name] = {
+                'p50_ms': round(percentile(timings, 0.5), 3),
+                'p95_ms': round(percentile(timings, 0.95), 3),
+                'queries': len(queries.captured_queries),
+                'peak_memory_kib': round(peak / 1024, 1),
+            }
+        return results
+
+    def print_results(self, results):
+        self.stdout.write(
+            f'{"endpoint":<26}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"queries":>9}{"mem KiB":>10}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<26}{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                f'{result["queries"]:>9}{result["peak_memory_kib"]:>10}'
+            )
+
+    def print_comparison(self, results, path):
+        with open(path, encoding='utf8') as file:
+            previous = json.load(file)['results']
+        self.stdout.write(f'Compared with {path}:')
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            changes = []
+            for metric in ('p50_ms', 'p95_ms', 'queries', 'peak_memory_kib'):
+                old, new = previous[name][metric], result[metric]
+                change = (new - old) / old * 100 if old else 0
+                changes.append(f'{metric} {old} -> {new} ({change:+.1f}%)')
+            self.stdout.write(f'{name:<26}' + ', '.join(changes))
@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import override_settings
+
+from recipes.management.commands.benchmark_api import percentile
+
+DEFAULT_PATHS = ('/api/tags/', '/api/recipes/')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare request latency with a new database connection per '
+        'request against a persistent connection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Path to request, may be repeated.',
+        )
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--max-age', type=int, default=60)
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.connects = 0
+        connection_created.connect(self.count_connect)
+        paths = options['paths'] or DEFAULT_PATHS
+        self.stdout.write(
+            f'{"path":<24}{"mode":<12}{"p50 ms":>10}{"p95 ms":>10}'
+            f'{"connects":>10}'
+        )
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'], API_CACHE_TIMEOUT=0
+            ):
+                for path in paths:
+                    for mode, max_age in (
+                        ('per-request', 0),
+                        ('persistent', options['max_age']),
+                    ):
+                        p50, p95, connects = self.run(path, max_age)
+                        self.stdout.write(
+                            f'{path:<24}{mode:<12}{p50:>10}{p95:>10}'
+                            f'{connects:>10}'
+                        )
+        finally:
+            connection_created.disconnect(self.count_connect)
+
+    def count_connect(self, sender, **kwargs):
+        self.connects += 1
+
+    def run(self, path, max_age):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        client = Client()
+        self.connects = 0
+        timings = []
+        for _ in range(self.options['iterations']):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            close_old_connections()
+            if response.status_code != 200:
+                raise CommandError(
+                    f'GET {path} returned {response.status_code}'
+                )
+        return (
+            round(percentile(timings, 0.5), 3),
+            round(percentile(timings, 0.95), 3),
+            self.connects,
+        )
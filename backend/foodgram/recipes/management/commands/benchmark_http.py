@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.management.commands.benchmark_api import percentile
+
+DEFAULT_PATHS = (
+    '/api/recipes/',
+    '/api/tags/',
+    '/api/ingredients/?name=мук',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure throughput and latency of a running server under '
+        'concurrent load.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--path',
+            action='append',
+            dest='paths',
+            help='Path to request, may be repeated.',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 16, 64]
+        )
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--token')
+        parser.add_argument(
+            '--host', help='Host header, must be listed in ALLOWED_HOSTS.'
+        )
+        parser.add_argument('--label', default='')
+        parser.add_argument(
+            '--output', help='Write the results as JSON to this file.'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.headers = {}
+        if options['token']:
+            self.headers['Authorization'] = f'Token {options["token"]}'
+        if options['host']:
+            self.headers['Host'] = options['host']
+        paths = options['paths'] or DEFAULT_PATHS
+        results = {}
+        self.stdout.write(
+            f'{"path":<32}{"conc":>6}{"rps":>10}{"p50 ms":>10}'
+            f'{"p95 ms":>10}{"errors":>8}'
+        )
+        for path in paths:
+            for concurrency in options['concurrency']:
+                result = self.run(path, concurrency)
+                results.setdefault(path, {})[concurrency] = result
+                self.stdout.write(
+                    f'{path:<32}{concurrency:>6}{result["rps"]:>10}'
+                    f'{result["p50_ms"]:>10}{result["p95_ms"]:>10}'
+                    f'{result["errors"]:>8}'
+                )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                json.dump(
+                    {'label': options['label'], 'results': results},
+                    file,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def run(self, path, concurrency):
+        url = self.options['url'].rstrip('/') + path
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                response = local.session.get(url, headers=self.headers)
+                response.content
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            return (time.perf_counter() - started) * 1000, ok
+
+        try:
+            requests.get(url, headers=self.headers, timeout=10)
+        except requests.RequestException as error:
+            raise CommandError(f'{url} is not reachable: {error}')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            samples = list(
+                executor.map(fetch, range(self.options['requests']))
+            )
+        elapsed = time.perf_counter() - started
+        timings = [timing for timing, _ in samples]
+        return {
+            'rps': round(len(samples) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'errors': sum(1 for _, ok in samples if not ok),
+        }
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate missing thumbnail, card and full variants of recipe '
+        'images.'
+    )
+
+    def handle(self, *args, **options):
+        built = failed = 0
+        recipe_ids = (
+            Recipe.objects.exclude(image='')
+            .exclude(image=None)
+            .values_list('id', flat=True)
+            .iterator()
+        )
+        for recipe_id in recipe_ids:
+            try:
+                built += build_variants(recipe_id)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'Recipe {recipe_id}: {error}')
+        self.stdout.write(
+            self.style.SUCCESS(f'Built variants for {built} recipes')
+        )
+        if failed:
+            self.stdout.write(self.style.WARNING(f'Failed: {failed}'))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.similarity import (
+    build_similar_recipes,
+    lock_similar_recipes,
+    refresh_similar_recipes,
+    similarity_available,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Precompute similar recipes from ingredient and tag vectors. By '
+        'default every recipe is recomputed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--changed',
+            action='store_true',
+            help='Only refresh recipes changed since the last run and the '
+            'recipes they appear next to.',
+        )
+
+    def handle(self, *args, **options):
+        if not similarity_available():
+            raise CommandError('numpy and scipy are required')
+        started = time.perf_counter()
+        with transaction.atomic():
+            if not lock_similar_recipes():
+                self.stdout.write('Another run is in progress, skipped')
+                return
+            if options['changed']:
+                total = refresh_similar_recipes()
+            else:
+                total = build_similar_recipes()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Similar recipes computed for {total} recipes '
+                f'in {elapsed:.2f}s'
+            )
+        )
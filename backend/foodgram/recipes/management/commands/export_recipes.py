@@ -0,0 +1,36 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.transfer import export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Export recipes with tags and ingredients as NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', help='File to write to. Defaults to stdout.'
+        )
+        parser.add_argument('--author', help='Export only this author.')
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.all()
+        if options['author']:
+            queryset = queryset.filter(author__email=options['author'])
+        output = (
+            open(options['output'], 'w', encoding='utf8')
+            if options['output']
+            else sys.stdout
+        )
+        count = 0
+        try:
+            for record in export_recipes(queryset):
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                count += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(f'Exported {count} recipes')
@@ -0,0 +1,48 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import TRANSFER_CHUNK_SIZE, RecipeImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Import recipes from NDJSON. Tags, ingredients and authors are '
+        'resolved by slug, name and email. Invalid records are reported '
+        'and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON file, "-" for stdin.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=TRANSFER_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            file = sys.stdin.buffer
+        else:
+            try:
+                file = open(options['path'], 'rb')
+            except OSError as error:
+                raise CommandError(error)
+        started = time.perf_counter()
+        try:
+            result = RecipeImporter(options['chunk_size']).run(file)
+        finally:
+            if file is not sys.stdin.buffer:
+                file.close()
+        for error in result['errors']:
+            self.stderr.write(
+                f'Line {error["line"]}: '
+                + json.dumps(error['errors'], ensure_ascii=False)
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Imported {result["created"]} recipes in '
+                f'{time.perf_counter() - started:.2f}s, '
+                f'{len(result["errors"])} errors'
+            )
+        )
@@ -1,27 +1,196 @@
 import csv
-from django.core.management.base import BaseCommand
-import psycopg2
+import io
+import json
+import os
+import sys
+import time
+from itertools import islice
 
-from foodgram.settings import DATABASES
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import bump_version
+from recipes.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+DEFAULT_FILES = (
+    os.path.join(
+        os.path.dirname(os.path.dirname(settings.BASE_DIR)),
+        'data',
+        'ingredients.csv',
+    ),
+    os.path.join(settings.BASE_DIR, 'fixtures_ingredients.csv'),
+)
+FORMATS = ('csv', 'json')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def detect_format(path, file):
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    if extension in FORMATS:
+        return extension
+    head = file.buffer.peek(64) if hasattr(file, 'buffer') else b''
+    if head.decode('utf8', 'ignore').lstrip()[:1] in ('[', '{'):
+        return 'json'
+    return 'csv'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2 and row[0].strip():
+            yield row[0].strip(), row[1].strip()
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    exhausted = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n[],':
+            position += 1
+        if position == len(buffer) and exhausted:
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if exhausted:
+                raise CommandError(
+                    f'Invalid JSON near: {buffer[position:position + 80]}'
+                )
+            chunk = file.read(JSON_CHUNK_SIZE)
+            exhausted = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        position = end
+        try:
+            row = item['name'].strip(), item['measurement_unit'].strip()
+        except (AttributeError, KeyError, TypeError):
+            raise CommandError(f'Invalid ingredient: {item}')
+        yield row
 
 
 class Command(BaseCommand):
+    help = (
+        'Load ingredients from a CSV or JSON file or stdin. Existing '
+        'ingredients get their measurement unit updated.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            help='CSV or JSON file, "-" for stdin. Defaults to '
+            'data/ingredients.csv.',
+        )
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=5000)
 
     def handle(self, *args, **options):
-        data_path = f'fixtures_ingredients.csv'
-        with open(data_path, 'r', encoding='utf8') as csv_file:
-            database = csv.DictReader(csv_file)
-            database.fieldnames = ['name', 'measurement_unit']
-            connection = psycopg2.connect(
-                dbname=DATABASES['default']['NAME'],
-                user=DATABASES['default']['USER'],
-                password=DATABASES['default']['PASSWORD'],
-                host=DATABASES['default']['HOST'],
-                port=DATABASES['default']['PORT'],
+        path = options['path'] or next(
+            (path for path in DEFAULT_FILES if os.path.exists(path)), None
+        )
+        if path is None:
+            raise CommandError('Ingredients file not found')
+        if path == '-':
+            file = sys.stdin
+        elif os.path.exists(path):
+            file = open(path, encoding='utf8', newline='')
+        else:
+            raise CommandError(f'Ingredients file {path} not found')
+        try:
+            file_format = options['format'] or detect_format(path, file)
+            rows = read_json(file) if file_format == 'json' else read_csv(file)
+            before = Ingredient.objects.count()
+            started = time.perf_counter()
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    total = self.load_postgres(rows, options['batch_size'])
+                else:
+                    total = self.load_bulk(rows, options['batch_size'])
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        elapsed = time.perf_counter() - started
+        ingredient_index.invalidate()
+        bump_version('ingredients')
+        created = Ingredient.objects.count() - before
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Read {total} rows in {elapsed:.2f}s '
+                f'({total / elapsed if elapsed else 0:.0f} rows/s), '
+                f'{created} new ingredients'
+            )
+        )
+
+    def batches(self, rows, batch_size):
+        rows = iter(rows)
+        started = time.perf_counter()
+        total = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            yield batch
+            total += len(batch)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{total} rows, {total / elapsed if elapsed else 0:.0f} rows/s'
+            )
+
+    def load_bulk(self, rows, batch_size):
+        total = 0
+        for batch in self.batches(rows, batch_size):
+            units = dict(batch)
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in units.items()
+                ),
+                ignore_conflicts=True,
+            )
+            changed = [
+                ingredient
+                for ingredient in Ingredient.objects.filter(name__in=units)
+                if ingredient.measurement_unit != units[ingredient.name]
+            ]
+            for ingredient in changed:
+                ingredient.measurement_unit = units[ingredient.name]
+            Ingredient.objects.bulk_update(
+                changed, ('measurement_unit',), batch_size=batch_size
+            )
+            total += len(batch)
+        return total
+
+    def load_postgres(self, rows, batch_size):
+        table = Ingredient._meta.db_table
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_staging ('
+                'line serial, name varchar(200), '
+                'measurement_unit varchar(200))'
+            )
+            for batch in self.batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_staging (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer,
+                )
+                total += len(batch)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT ON (name) name, measurement_unit '
+                'FROM ingredient_staging ORDER BY name, line DESC '
+                'ON CONFLICT (name) DO UPDATE '
+                'SET measurement_unit = EXCLUDED.measurement_unit '
+                f'WHERE {table}.measurement_unit '
+                'IS DISTINCT FROM EXCLUDED.measurement_unit'
             )
-            cursor = connection.cursor()
-            columns = ','.join(database.fieldnames)
-            sql_request = f"""copy recipes_ingredient({columns})
-                        from stdout with (format csv)"""
-            cursor.copy_expert(sql_request, csv_file)
-            connection.commit()
+            cursor.execute('DROP TABLE ingredient_staging')
+        return total
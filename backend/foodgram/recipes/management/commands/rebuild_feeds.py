@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.feed import fan_out_pending, rebuild_feeds
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild followed-author timelines from subscriptions, keeping the '
+        'latest FEED_BACKFILL recipes of every followed author.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pending',
+            action='store_true',
+            help='Only deliver recipes whose fan-out to followers has not '
+            'finished, keeping existing timelines.',
+        )
+
+    def handle(self, *args, **options):
+        if options['pending']:
+            total = fan_out_pending()
+            self.stdout.write(
+                self.style.SUCCESS(f'Fanned out {total} pending recipes')
+            )
+            return
+        with transaction.atomic():
+            rebuild_feeds()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Feeds rebuilt, {FeedEntry.objects.count()} entries'
+            )
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.shopping_cart import check_shopping_carts, rebuild_shopping_carts
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalculate precomputed shopping cart totals, or compare them '
+        'with a full recompute.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report totals that differ from a full recompute.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            with transaction.atomic():
+                rebuild_shopping_carts()
+            self.stdout.write(self.style.SUCCESS('Shopping carts rebuilt'))
+            return
+        mismatches = check_shopping_carts()
+        for user_id, ingredient_id, stored, expected in mismatches:
+            self.stdout.write(
+                f'user {user_id}, ingredient {ingredient_id}: '
+                f'stored {stored}, expected {expected}'
+            )
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} totals differ')
+        self.stdout.write(self.style.SUCCESS('Shopping carts are consistent'))
@@ -0,0 +1,139 @@
+from django.db import NotSupportedError, migrations
+
+CREATE_SEARCH = (
+    'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+    'tsvector',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_vector(
+        recipe_id integer, name text, description text
+    ) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+            || setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(ingredient.name, ' ')
+                FROM recipes_recipeingredient link
+                JOIN recipes_ingredient ingredient
+                    ON ingredient.id = link.ingredient_id
+                WHERE link.recipe_id = $1
+            ), '')), 'B')
+            || setweight(to_tsvector('russian', coalesce(description, '')), 'C')
+    $$ LANGUAGE sql STABLE
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_row() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := recipes_recipe_search_vector(
+            NEW.id, NEW.name, NEW.text
+        );
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_recipe_search_links() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE recipes_recipe
+            SET search_vector = recipes_recipe_search_vector(id, name, text)
+            WHERE id IN (SELECT recipe_id FROM old_links);
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE recipes_recipe
+            SET search_vector = recipes_recipe_search_vector(id, name, text)
+            WHERE id IN (
+                SELECT recipe_id FROM old_links
+                UNION SELECT recipe_id FROM new_links
+            );
+        ELSE
+            UPDATE recipes_recipe
+            SET search_vector = recipes_recipe_search_vector(id, name, text)
+            WHERE id IN (SELECT recipe_id FROM new_links);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION recipes_ingredient_search_names()
+    RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe
+        SET search_vector = recipes_recipe_search_vector(id, name, text)
+        WHERE id IN (
+            SELECT recipe_id FROM recipes_recipeingredient
+            WHERE ingredient_id = NEW.id
+        );
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    ''',
+    'CREATE TRIGGER recipes_recipe_search_row '
+    'BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe '
+    'FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_row()',
+    'CREATE TRIGGER recipes_recipeingredient_search_insert '
+    'AFTER INSERT ON recipes_recipeingredient '
+    'REFERENCING NEW TABLE AS new_links '
+    'FOR EACH STATEMENT EXECUTE PROCEDURE recipes_recipe_search_links()',
+    'CREATE TRIGGER recipes_recipeingredient_search_update '
+    'AFTER UPDATE ON recipes_recipeingredient '
+    'REFERENCING OLD TABLE AS old_links NEW TABLE AS new_links '
+    'FOR EACH STATEMENT EXECUTE PROCEDURE recipes_recipe_search_links()',
+    'CREATE TRIGGER recipes_recipeingredient_search_delete '
+    'AFTER DELETE ON recipes_recipeingredient '
+    'REFERENCING OLD TABLE AS old_links '
+    'FOR EACH STATEMENT EXECUTE PROCEDURE recipes_recipe_search_links()',
+    'CREATE TRIGGER recipes_ingredient_search_names '
+    'AFTER UPDATE OF name ON recipes_ingredient '
+    'FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name) '
+    'EXECUTE PROCEDURE recipes_ingredient_search_names()',
+    'UPDATE recipes_recipe '
+    'SET search_vector = recipes_recipe_search_vector(id, name, text)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_idx '
+    'ON recipes_recipe USING gin (search_vector)',
+)
+
+DROP_SEARCH = (
+    'DROP TRIGGER IF EXISTS recipes_ingredient_search_names '
+    'ON recipes_ingredient',
+    'DROP TRIGGER IF EXISTS recipes_recipeingredient_search_delete '
+    'ON recipes_recipeingredient',
+    'DROP TRIGGER IF EXISTS recipes_recipeingredient_search_update '
+    'ON recipes_recipeingredient',
+    'DROP TRIGGER IF EXISTS recipes_recipeingredient_search_insert '
+    'ON recipes_recipeingredient',
+    'DROP TRIGGER IF EXISTS recipes_recipe_search_row ON recipes_recipe',
+    'DROP FUNCTION IF EXISTS recipes_ingredient_search_names()',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_links()',
+    'DROP FUNCTION IF EXISTS recipes_recipe_search_row()',
+    'DROP FUNCTION IF EXISTS '
+    'recipes_recipe_search_vector(integer, text, text)',
+    'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+)
+
+
+def create_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    if schema_editor.connection.pg_version < 100000:
+        raise NotSupportedError(
+            'Recipe search triggers use transition tables and require '
+            'PostgreSQL 10 or newer'
+        )
+    for statement in CREATE_SEARCH:
+        schema_editor.execute(statement)
+
+
+def drop_search(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for statement in DROP_SEARCH:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shopping_cart_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.19 on 2026-10-18 21:34
+
+from django.db import migrations, models
+
+
+def mark_existing(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(fanned_out=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_cache_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='fanned_out',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Разослан в ленты'),
+        ),
+        migrations.RunPython(mark_existing, migrations.RunPython.noop),
+    ]
@@ -88,6 +88,24 @@ class Recipe(models.Model):
         verbose_name='Фото блюда',
         help_text='Приложите фото блюда',
     )
+    image_thumbnail = models.ImageField(
+        upload_to='recipes/images/variants/',
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра',
+    )
+    image_card = models.ImageField(
+        upload_to='recipes/images/variants/',
+        blank=True,
+        editable=False,
+        verbose_name='Фото для карточки',
+    )
+    image_full = models.ImageField(
+        upload_to='recipes/images/variants/',
+        blank=True,
+        editable=False,
+        verbose_name='Фото для страницы рецепта',
+    )
     text = models.TextField(
         blank=True,
         null=True,
@@ -104,6 +122,21 @@ class Recipe(models.Model):
     pub_date = models.DateTimeField(
         auto_now_add=True, verbose_name='Дата публикации', db_index=True
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, verbose_name='Дата изменения'
+    )
+    similar_updated_at = models.DateTimeField(
+        null=True, editable=False, verbose_name='Дата расчёта похожих'
+    )
+    fanned_out = models.BooleanField(
+        default=False, editable=False, verbose_name='Разослан в ленты'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
@@ -118,6 +151,15 @@ class Recipe(models.Model):
                 name='unique_name',
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'), name='recipe_latest_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx',
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -151,6 +193,113 @@ class ShoppingList(models.Model):
         return f'{self.user} {self.recipe}'
 
 
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_totals',
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_totals',
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+    amount = models.PositiveIntegerField(
+        default=0, verbose_name='Общее количество'
+    )
+
+    class Meta:
+        verbose_name = 'Итог списка покупок'
+        verbose_name_plural = 'Итоги списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'), name='shopping_total_model'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='feed',
+        verbose_name='Читатель',
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи лент'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'), name='feed_entry_model'
+            )
+        ]
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_entry_user_idx',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class RecipeNeighbor(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='neighbors',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+    )
+    neighbor = models.ForeignKey(
+        Recipe,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+        on_delete=models.CASCADE,
+    )
+    score = models.FloatField(verbose_name='Сходство')
+    rank = models.PositiveSmallIntegerField(verbose_name='Место')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'rank'), name='recipe_neighbor_model'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.neighbor} {self.score:.3f}'
+
+
+class CacheVersion(models.Model):
+    namespace = models.CharField(
+        max_length=64, unique=True, verbose_name='Пространство имён'
+    )
+    version = models.FloatField(verbose_name='Версия')
+
+    class Meta:
+        verbose_name = 'Версия кэша'
+        verbose_name_plural = 'Версии кэша'
+
+    def __str__(self):
+        return f'{self.namespace} {self.version}'
+
+
 class Favorite(models.Model):
     user = models.ForeignKey(
         User,
@@ -229,6 +378,9 @@ class RecipeTag(models.Model):
                 fields=('recipe', 'tag'), name='recipe_tag_model'
             )
         ]
+        indexes = [
+            models.Index(fields=('tag', 'recipe'), name='recipe_tag_tag_idx')
+        ]
 
     def __str__(self):
         return f'{self.recipe} {self.tag}'
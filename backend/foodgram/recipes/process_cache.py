@@ -0,0 +1,33 @@
+import itertools
+import threading
+import time
+
+
+class ProcessCache:
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.data = None
+        self.loaded_at = None
+        self.generations = itertools.count(1)
+        self.generation = 0
+
+    def invalidate(self):
+        self.generation = next(self.generations)
+        self.loaded_at = None
+
+    def load(self):
+        raise NotImplementedError
+
+    def get(self):
+        loaded_at = self.loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.ttl:
+            with self.lock:
+                if self.loaded_at is loaded_at:
+                    generation = self.generation
+                    data = self.load()
+                    self.data = data
+                    if self.generation == generation:
+                        self.loaded_at = time.monotonic()
+                    return data
+        return self.data
@@ -0,0 +1,123 @@
+from django.db import IntegrityError, connection, transaction
+from django.http import Http404
+
+from api.cache import bump_version, user_namespace
+from recipes.counters import COUNTERS, change_counter
+from recipes.feed import follow_feed, unfollow_feed
+from recipes.models import Favorite, ShoppingList
+from recipes.shopping_cart import add_to_carts, remove_from_carts
+from users.models import Follow
+
+RELATION_TARGETS = {
+    Favorite: 'recipe_id',
+    ShoppingList: 'recipe_id',
+    Follow: 'author_id',
+}
+RELATION_NAMESPACES = {Favorite: 'favorites'}
+
+
+def relation_changed(model, user_id, target_ids, delta):
+    if not target_ids:
+        return
+    for counted, target, _, counter in COUNTERS:
+        if counted is model:
+            change_counter(
+                target.objects.filter(pk__in=target_ids), counter, delta
+            )
+    if model is ShoppingList:
+        update_carts = add_to_carts if delta > 0 else remove_from_carts
+        update_carts([user_id], target_ids)
+    if model is Follow:
+        update_feed = follow_feed if delta > 0 else unfollow_feed
+        update_feed(user_id, target_ids)
+    if model in RELATION_NAMESPACES:
+        bump_version(RELATION_NAMESPACES[model])
+    bump_version(user_namespace(user_id))
+
+
+def relation_columns(model, field):
+    return (
+        model._meta.db_table,
+        model._meta.get_field('user').column,
+        model._meta.get_field(field).column,
+    )
+
+
+def fetch_targets(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {target_id for target_id, in cursor.fetchall()}
+
+
+def insert_relations(model, user_id, field, target_ids):
+    table, user_column, column = relation_columns(model, field)
+    sql = f'INSERT INTO {table} ({user_column}, {column}) VALUES '
+    if connection.vendor == 'postgresql':
+        return fetch_targets(
+            sql
+            + ', '.join(['(%s, %s)'] * len(target_ids))
+            + f' ON CONFLICT DO NOTHING RETURNING {column}',
+            [
+                value
+                for target_id in target_ids
+                for value in (user_id, target_id)
+            ],
+        )
+    inserted = set()
+    with connection.cursor() as cursor:
+        for target_id in target_ids:
+            try:
+                with transaction.atomic():
+                    cursor.execute(sql + '(%s, %s)', (user_id, target_id))
+            except IntegrityError:
+                continue
+            inserted.add(target_id)
+    return inserted
+
+
+def delete_relations(model, user_id, field, target_ids):
+    table, user_column, column = relation_columns(model, field)
+    sql = f'DELETE FROM {table} WHERE {user_column} = %s AND {column} '
+    if connection.vendor == 'postgresql':
+        return fetch_targets(
+            sql + f'= ANY(%s) RETURNING {column}', (user_id, target_ids)
+        )
+    deleted = set()
+    with connection.cursor() as cursor:
+        for target_id in target_ids:
+            cursor.execute(sql + '= %s', (user_id, target_id))
+            if cursor.rowcount:
+                deleted.add(target_id)
+    return deleted
+
+
+def add_relations(model, user, field, target_ids):
+    with transaction.atomic():
+        inserted = insert_relations(model, user.pk, field, target_ids)
+        added = [
+            target_id for target_id in target_ids if target_id in inserted
+        ]
+        relation_changed(model, user.pk, added, 1)
+    return added
+
+
+def remove_relations(model, user, field, target_ids):
+    with transaction.atomic():
+        deleted = delete_relations(model, user.pk, field, target_ids)
+        removed = [
+            target_id for target_id in target_ids if target_id in deleted
+        ]
+        relation_changed(model, user.pk, removed, -1)
+    return len(removed)
+
+
+def add_relation(model, user, field, target_id):
+    return bool(add_relations(model, user, field, [target_id]))
+
+
+def remove_relation(model, user, field, target_id):
+    try:
+        target_id = int(target_id)
+    except (TypeError, ValueError):
+        raise Http404
+    return bool(remove_relations(model, user, field, [target_id]))
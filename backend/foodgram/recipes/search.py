@@ -0,0 +1,67 @@
+import re
+
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from recipes.models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+SEARCH_WEIGHTS = {'name': 1.0, 'ingredients': 0.4, 'text': 0.2}
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or '').casefold())
+
+
+def fallback_search(query):
+    tokens = sorted(set(tokenize(query)))
+    matches = Q() if tokens else Q(pk__in=())
+    rank = Value(0.0, output_field=FloatField())
+    for token in tokens:
+        lookups = {
+            'name': Q(name__icontains=token),
+            'ingredients': Q(
+                pk__in=RecipeIngredient.objects.filter(
+                    ingredient__name__icontains=token
+                ).values('recipe_id')
+            ),
+            'text': Q(text__icontains=token),
+        }
+        condition = Q()
+        for field, lookup in lookups.items():
+            condition |= lookup
+            rank = rank + Case(
+                When(lookup, then=Value(SEARCH_WEIGHTS[field])),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        matches &= condition
+    return matches, rank
+
+
+def search_recipes(queryset, query):
+    if connections[queryset.db].vendor == 'postgresql':
+        table = Recipe._meta.db_table
+        params = (SEARCH_CONFIG, query)
+        matches = Q(
+            pk__in=RawSQL(
+                f'SELECT id FROM {table} '
+                'WHERE search_vector @@ plainto_tsquery(%s::regconfig, %s)',
+                params,
+            )
+        )
+        rank = RawSQL(
+            f'ts_rank({table}.search_vector, '
+            'plainto_tsquery(%s::regconfig, %s))',
+            params,
+            output_field=FloatField(),
+        )
+    else:
+        matches, rank = fallback_search(query)
+    return (
+        queryset.filter(matches)
+        .annotate(search_rank=rank)
+        .order_by('-search_rank', '-pub_date', '-id')
+    )
@@ -0,0 +1,143 @@
+from collections import Counter
+from typing import Iterator, NamedTuple
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.bulk import bulk_batch_size
+from recipes.models import RecipeIngredient, ShoppingCartTotal, ShoppingList
+
+
+class ShoppingCartRow(NamedTuple):
+    name: str
+    measurement_unit: str
+    amount: int
+
+
+def aggregate_shopping_cart(user) -> Iterator[ShoppingCartRow]:
+    rows = (
+        ShoppingCartTotal.objects.filter(user=user, amount__gt=0)
+        .order_by('ingredient__name', 'ingredient__measurement_unit')
+        .values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        )
+    )
+    for name, measurement_unit, amount in rows.iterator():
+        yield ShoppingCartRow(name, measurement_unit, amount)
+
+
+def recompute_shopping_carts():
+    return (
+        RecipeIngredient.objects.filter(
+            recipe__shopping__isnull=False, ingredient__isnull=False
+        )
+        .values('recipe__shopping__user', 'ingredient')
+        .annotate(total=Sum('amount'))
+        .order_by()
+        .values_list('recipe__shopping__user', 'ingredient', 'total')
+    )
+
+
+def recipe_amounts(recipe_ids):
+    amounts = Counter()
+    for ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids, ingredient__isnull=False
+    ).values_list('ingredient_id', 'amount'):
+        amounts[ingredient_id] += amount
+    return amounts
+
+
+def apply_cart_deltas(user_ids, deltas):
+    deltas = {
+        ingredient_id: delta
+        for ingredient_id, delta in deltas.items()
+        if ingredient_id is not None and delta
+    }
+    if not deltas:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids
+            for ingredient_id, delta in deltas.items()
+            if delta > 0
+        ),
+        ignore_conflicts=True,
+    )
+    rows = ShoppingCartTotal.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=deltas
+    )
+    rows.update(
+        amount=Greatest(
+            F('amount')
+            + Case(
+                *(
+                    When(ingredient_id=ingredient_id, then=Value(delta))
+                    for ingredient_id, delta in deltas.items()
+                ),
+                output_field=IntegerField(),
+            ),
+            0,
+        )
+    )
+    if any(delta < 0 for delta in deltas.values()):
+        rows.filter(amount=0).delete()
+
+
+def add_to_carts(user_ids, recipe_ids):
+    apply_cart_deltas(user_ids, recipe_amounts(recipe_ids))
+
+
+def remove_from_carts(user_ids, recipe_ids):
+    apply_cart_deltas(
+        user_ids,
+        {
+            ingredient_id: -amount
+            for ingredient_id, amount in recipe_amounts(recipe_ids).items()
+        },
+    )
+
+
+def apply_recipe_deltas(recipe, deltas):
+    apply_cart_deltas(
+        ShoppingList.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True
+        ),
+        deltas,
+    )
+
+
+def rebuild_shopping_carts():
+    ShoppingCartTotal.objects.all().delete()
+    ShoppingCartTotal.objects.bulk_create(
+        (
+            ShoppingCartTotal(
+                user_id=user_id, ingredient_id=ingredient_id, amount=total
+            )
+            for user_id, ingredient_id, total in recompute_shopping_carts()
+        ),
+        batch_size=bulk_batch_size(ShoppingCartTotal, 1000),
+    )
+
+
+def check_shopping_carts():
+    expected = {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in recompute_shopping_carts()
+    }
+    stored = {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in (
+            ShoppingCartTotal.objects.filter(amount__gt=0).values_list(
+                'user_id', 'ingredient_id', 'amount'
+            )
+        )
+    }
+    return sorted(
+        (*key, stored.get(key), expected.get(key))
+        for key in expected.keys() | stored.keys()
+        if stored.get(key) != expected.get(key)
+    )
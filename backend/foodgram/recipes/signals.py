@@ -0,0 +1,156 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_tokens
+from api.cache import bump_version
+from recipes.autocomplete import ingredient_index
+from recipes.counters import COUNTERS, change_counter
+from recipes.feed import feed_workers
+from recipes.images import image_workers, needs_variants
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+from recipes.relations import RELATION_TARGETS, relation_changed
+from recipes.tag_cache import tag_slug_cache
+from users.models import User
+
+CACHE_NAMESPACES = (
+    (Recipe, 'recipes'),
+    (RecipeIngredient, 'recipes'),
+    (RecipeTag, 'recipes'),
+    (Tag, 'tags'),
+    (Ingredient, 'ingredients'),
+    (User, 'users'),
+)
+
+
+def counter_receivers(target, field, counter):
+    def created(sender, instance, created, **kwargs):
+        if created:
+            change_counter(
+                target.objects.filter(pk=getattr(instance, f'{field}_id')),
+                counter,
+                1,
+            )
+
+    def deleted(sender, instance, **kwargs):
+        change_counter(
+            target.objects.filter(pk=getattr(instance, f'{field}_id')),
+            counter,
+            -1,
+        )
+
+    return created, deleted
+
+
+for model, target, field, counter in COUNTERS:
+    if model in RELATION_TARGETS:
+        continue
+    created, deleted = counter_receivers(target, field, counter)
+    post_save.connect(
+        created, sender=model, weak=False, dispatch_uid=f'{counter}_created'
+    )
+    post_delete.connect(
+        deleted, sender=model, weak=False, dispatch_uid=f'{counter}_deleted'
+    )
+
+
+def invalidate_ingredient_index(sender, **kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+post_save.connect(invalidate_ingredient_index, sender=Ingredient)
+post_delete.connect(invalidate_ingredient_index, sender=Ingredient)
+
+
+def cache_version_receiver(namespace):
+    def receiver(sender, update_fields=None, **kwargs):
+        if update_fields is not None and set(update_fields) == {'last_login'}:
+            return
+        bump_version(namespace)
+
+    return receiver
+
+
+for model, namespace in CACHE_NAMESPACES:
+    receiver = cache_version_receiver(namespace)
+    for signal, action in ((post_save, 'saved'), (post_delete, 'deleted')):
+        signal.connect(
+            receiver,
+            sender=model,
+            weak=False,
+            dispatch_uid=f'{model.__name__}_{action}_cache_version',
+        )
+
+
+def relation_created(sender, instance, created, **kwargs):
+    if created:
+        relation_changed(
+            sender,
+            instance.user_id,
+            [getattr(instance, RELATION_TARGETS[sender])],
+            1,
+        )
+
+
+def relation_deleted(sender, instance, **kwargs):
+    relation_changed(
+        sender,
+        instance.user_id,
+        [getattr(instance, RELATION_TARGETS[sender])],
+        -1,
+    )
+
+
+for model in RELATION_TARGETS:
+    post_save.connect(relation_created, sender=model)
+    pre_delete.connect(relation_deleted, sender=model)
+
+
+def forget_deleted_token(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: forget_tokens([key]))
+
+
+def forget_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    transaction.on_commit(lambda: forget_tokens(keys))
+
+
+post_delete.connect(forget_deleted_token, sender=Token)
+post_save.connect(forget_user_tokens, sender=User)
+
+
+def invalidate_tag_slug_cache(sender, **kwargs):
+    transaction.on_commit(tag_slug_cache.invalidate)
+
+
+post_save.connect(invalidate_tag_slug_cache, sender=Tag)
+post_delete.connect(invalidate_tag_slug_cache, sender=Tag)
+
+
+def schedule_image_variants(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if needs_variants(instance):
+        transaction.on_commit(lambda: image_workers.submit(instance.pk))
+
+
+post_save.connect(schedule_image_variants, sender=Recipe)
+
+
+def recipe_published(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed_workers.submit(instance.pk))
+
+
+post_save.connect(recipe_published, sender=Recipe)
@@ -0,0 +1,193 @@
+import zlib
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from recipes.bulk import bulk_batch_size
+from recipes.models import Recipe, RecipeIngredient, RecipeNeighbor, RecipeTag
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+
+SIMILAR_LOCK_KEY = zlib.crc32(RecipeNeighbor._meta.db_table.encode())
+
+
+def similarity_available():
+    return np is not None
+
+
+def lock_similar_recipes():
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_try_advisory_xact_lock(%s)', (SIMILAR_LOCK_KEY,)
+        )
+        return cursor.fetchone()[0]
+
+
+class RecipeVectors:
+    def __init__(self, recipe_ids):
+        self.recipe_ids = np.array(sorted(recipe_ids), dtype=np.int64)
+        ingredients = np.array(
+            RecipeIngredient.objects.filter(
+                recipe__isnull=False, ingredient__isnull=False
+            ).values_list('recipe_id', 'ingredient_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        tags = np.array(
+            RecipeTag.objects.values_list('recipe_id', 'tag_id'),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        ingredient_columns = np.unique(ingredients[:, 1])
+        tag_columns = np.unique(tags[:, 1])
+        rows = []
+        columns = []
+        weights = []
+        for pairs, features, offset, weight in (
+            (ingredients, ingredient_columns, 0, 1.0),
+            (
+                tags,
+                tag_columns,
+                len(ingredient_columns),
+                settings.SIMILAR_TAG_WEIGHT,
+            ),
+        ):
+            pairs = pairs[np.isin(pairs[:, 0], self.recipe_ids)]
+            rows.append(np.searchsorted(self.recipe_ids, pairs[:, 0]))
+            columns.append(np.searchsorted(features, pairs[:, 1]) + offset)
+            weights.append(np.full(len(pairs), weight, dtype=np.float32))
+        matrix = sparse.csr_matrix(
+            (
+                np.concatenate(weights),
+                (np.concatenate(rows), np.concatenate(columns)),
+            ),
+            shape=(
+                len(self.recipe_ids),
+                len(ingredient_columns) + len(tag_columns),
+            ),
+            dtype=np.float32,
+        )
+        frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+        idf = np.log((len(self.recipe_ids) + 1) / (frequency + 1)) + 1
+        matrix = matrix @ sparse.diags(idf.astype(np.float32))
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)))
+        norms[norms == 0] = 1
+        self.matrix = sparse.csr_matrix(
+            sparse.diags(1 / norms.ravel().astype(np.float32)) @ matrix
+        )
+
+    def neighbors(self, recipe_ids, count):
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        recipe_ids = recipe_ids[np.isin(recipe_ids, self.recipe_ids)]
+        positions = np.searchsorted(self.recipe_ids, recipe_ids)
+        count = min(count, len(self.recipe_ids) - 1)
+        block_size = settings.SIMILAR_BLOCK_SIZE
+        for start in range(0, len(positions), block_size):
+            block = positions[start : start + block_size]
+            scores = np.ascontiguousarray(
+                (self.matrix @ self.matrix[block].toarray().T).T
+            )
+            scores[np.arange(len(block)), block] = 0
+            if count <= 0:
+                top = np.zeros((len(block), 0), dtype=np.int64)
+            else:
+                top = np.argpartition(scores, -count, axis=1)[:, -count:]
+            for row, position in enumerate(block):
+                candidates = top[row]
+                candidate_scores = scores[row, candidates]
+                order = np.argsort(-candidate_scores, kind='stable')
+                yield int(self.recipe_ids[position]), [
+                    (int(self.recipe_ids[candidate]), float(score))
+                    for candidate, score in zip(
+                        candidates[order], candidate_scores[order]
+                    )
+                    if score > 0
+                ]
+
+
+def create_neighbors(neighbors):
+    RecipeNeighbor.objects.bulk_create(
+        (
+            RecipeNeighbor(
+                recipe_id=recipe_id,
+                neighbor_id=neighbor_id,
+                score=score,
+                rank=rank,
+            )
+            for recipe_id, similar in neighbors
+            for rank, (neighbor_id, score) in enumerate(similar, 1)
+        ),
+        batch_size=bulk_batch_size(RecipeNeighbor, 1000),
+    )
+
+
+def mark_fresh(snapshot):
+    Recipe.objects.bulk_update(
+        (
+            Recipe(pk=recipe_id, similar_updated_at=updated_at)
+            for recipe_id, updated_at in snapshot
+        ),
+        ('similar_updated_at',),
+        batch_size=1000,
+    )
+
+
+def stale_recipes():
+    return Recipe.objects.filter(
+        Q(similar_updated_at__isnull=True)
+        | Q(similar_updated_at__lt=F('updated_at'))
+    )
+
+
+def build_similar_recipes():
+    snapshot = list(Recipe.objects.values_list('id', 'updated_at'))
+    vectors = RecipeVectors(recipe_id for recipe_id, _ in snapshot)
+    neighbors = vectors.neighbors(
+        vectors.recipe_ids, settings.SIMILAR_RECIPES_COUNT
+    )
+    with transaction.atomic():
+        RecipeNeighbor.objects.all().delete()
+        while True:
+            batch = list(islice(neighbors, settings.SIMILAR_BLOCK_SIZE))
+            if not batch:
+                break
+            create_neighbors(batch)
+        mark_fresh(snapshot)
+    return len(snapshot)
+
+
+def refresh_similar_recipes():
+    if not similarity_available():
+        return 0
+    snapshot = list(stale_recipes().values_list('id', 'updated_at'))
+    if not snapshot:
+        return 0
+    changed = {recipe_id for recipe_id, _ in snapshot}
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    if len(changed) * 2 > len(recipe_ids):
+        return build_similar_recipes()
+    vectors = RecipeVectors(recipe_ids)
+    count = settings.SIMILAR_RECIPES_COUNT
+    neighbors = dict(vectors.neighbors(sorted(changed), count))
+    affected = set(
+        RecipeNeighbor.objects.filter(neighbor_id__in=changed).values_list(
+            'recipe_id', flat=True
+        )
+    )
+    for similar in neighbors.values():
+        affected.update(neighbor_id for neighbor_id, _ in similar)
+    affected -= changed
+    neighbors.update(vectors.neighbors(sorted(affected), count))
+    with transaction.atomic():
+        RecipeNeighbor.objects.filter(recipe_id__in=list(neighbors)).delete()
+        create_neighbors(neighbors.items())
+        mark_fresh(snapshot)
+    return len(neighbors)
+
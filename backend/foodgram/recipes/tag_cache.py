@@ -0,0 +1,27 @@
+from django.conf import settings
+
+from recipes.models import Tag
+from recipes.process_cache import ProcessCache
+
+
+class TagSlugCache(ProcessCache):
+    def load(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+    def get_ids(self, slugs):
+        ids = self.get()
+        missing = [slug for slug in slugs if slug not in ids]
+        found = [ids[slug] for slug in slugs if slug in ids]
+        if missing:
+            stored = list(
+                Tag.objects.filter(slug__in=missing).values_list(
+                    'id', flat=True
+                )
+            )
+            if stored:
+                self.invalidate()
+            found.extend(stored)
+        return found
+
+
+tag_slug_cache = TagSlugCache(settings.TAG_CACHE_TTL)
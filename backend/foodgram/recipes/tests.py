@@ -0,0 +1,1333 @@
+import base64
+import importlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import http_date
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication, token_cache_key
+from api.cache import bump_version, get_versions
+from api.parsers import LimitedJSONParser, RequestTooLarge
+from api.serializers import RecipeSerializer
+from api.uploads import BASE64_CHUNK_SIZE, decode_base64_image
+from foodgram.asgi import application as asgi_application
+from foodgram.middleware import ConnectionHealthCheckMiddleware
+from recipes.autocomplete import ingredient_index
+from recipes.process_cache import ProcessCache
+from recipes.tag_cache import tag_slug_cache
+from recipes.feed import add_to_feed, fan_out_pending, feed_workers
+from recipes.images import IMAGE_VARIANTS, image_workers, needs_variants
+from recipes.relations import add_relations
+from recipes.shopping_cart import (
+    check_shopping_carts,
+    rebuild_shopping_carts,
+)
+from recipes.similarity import (
+    SIMILAR_LOCK_KEY,
+    build_similar_recipes,
+    create_neighbors,
+    refresh_similar_recipes,
+    similarity_available,
+    stale_recipes,
+)
+from recipes.management.commands.ingredients_to_postgres import (
+    Command as IngredientsCommand,
+)
+from recipes.counters import COUNTERS, count_subquery
+from recipes.models import (
+    CacheVersion,
+    Favorite,
+    FeedEntry,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeNeighbor,
+    ShoppingCartTotal,
+    ShoppingList,
+    Tag,
+)
+from users.models import Follow, User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        password='password-12345',
+        first_name=username,
+        last_name=username,
+    )
+
+
+def create_recipe(author, name, ingredients, **fields):
+    recipe = Recipe.objects.create(
+        author=author, name=name, cooking_time=10, **fields
+    )
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    return recipe
+
+
+class ShoppingCartDownloadTests(TestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.author = create_user('author')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(5)
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.author,
+                f'рецепт {index}',
+                (
+                    (cls.ingredients[index % 5], 10),
+                    (cls.ingredients[(index + 1) % 5], 5),
+                ),
+            )
+            for index in range(10)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(self.url, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[0])
+        with CaptureQueriesContext(connection) as single:
+            self.download()
+        for recipe in self.recipes[1:]:
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+        with self.assertNumQueries(len(single.captured_queries)):
+            content = self.download().decode()
+        for ingredient in self.ingredients:
+            self.assertIn(ingredient.name, content)
+        self.assertIn('30', content)
+
+
+def encode_cursor(position):
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+class RecipeFeedCursorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipes = [
+            create_recipe(cls.author, f'рецепт {index}', ())
+            for index in range(8)
+        ]
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_pages_follow_feed_ordering(self):
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        self.assertEqual(self.walk('/api/recipes/?feed=latest'), expected)
+        self.assertEqual(self.walk('/api/recipes/?feed=popular'), expected)
+        self.assertEqual(self.walk('/api/recipes/feed/'), expected)
+
+    def test_malformed_cursor_is_not_found(self):
+        cursors = (
+            'not-base64',
+            encode_cursor({'id': 1}),
+            encode_cursor([1]),
+            encode_cursor(['abc', 1]),
+            encode_cursor([None, None]),
+            encode_cursor(['2021-01-01T00:00:00+00:00', 'abc']),
+            encode_cursor([[1], {}]),
+        )
+        for url in (
+            '/api/recipes/?feed=latest&',
+            '/api/recipes/?feed=popular&',
+            '/api/recipes/feed/?',
+        ):
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(f'{url}cursor={cursor}')
+                    self.assertEqual(response.status_code, 404)
+
+
+class IngredientAutocompleteTests(TestCase):
+    url = '/api/ingredients/'
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'соль {index:02d}', measurement_unit='г')
+            for index in range(30)
+        )
+        Ingredient.objects.create(name='морская соль', measurement_unit='г')
+        Ingredient.objects.create(name='сахар', measurement_unit='г')
+
+    def setUp(self):
+        ingredient_index.invalidate()
+
+    def names(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.data]
+
+    def test_name_without_limit_returns_every_match(self):
+        names = self.names({'name': 'соль'})
+        self.assertEqual(len(names), 31)
+        self.assertEqual(names[-1], 'морская соль')
+
+    def test_explicit_limit_prefers_prefix_matches(self):
+        self.assertEqual(
+            self.names({'name': 'Соль', 'limit': 3}),
+            ['соль 00', 'соль 01', 'соль 02'],
+        )
+
+    def test_invalid_limit(self):
+        response = self.client.get(self.url, {'name': 'соль', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ProcessCacheTests(TransactionTestCase):
+    def test_invalidation_during_load_is_not_lost(self):
+        class Loads(ProcessCache):
+            count = 0
+
+            def load(self):
+                self.count += 1
+                if self.count == 1:
+                    self.invalidate()
+                return self.count
+
+        cache = Loads(300)
+        self.assertEqual(cache.get(), 1)
+        self.assertEqual(cache.get(), 2)
+        self.assertEqual(cache.get(), 2)
+
+    def test_index_is_invalidated_after_commit(self):
+        ingredient_index.invalidate()
+        self.assertEqual(ingredient_index.search('соль'), [])
+        with self.assertRaises(DatabaseError):
+            with transaction.atomic():
+                Ingredient.objects.create(name='соль', measurement_unit='г')
+                self.assertEqual(ingredient_index.search('соль'), [])
+                raise DatabaseError
+        self.assertEqual(ingredient_index.search('соль'), [])
+        with transaction.atomic():
+            Ingredient.objects.create(name='соль', measurement_unit='г')
+            self.assertEqual(ingredient_index.search('соль'), [])
+        self.assertEqual(
+            [entry['name'] for entry in ingredient_index.search('соль')],
+            ['соль'],
+        )
+
+class VersionBumpTests(TransactionTestCase):
+    def test_bump_is_deferred_until_commit(self):
+        before = get_versions(('recipes',))
+        with transaction.atomic():
+            bump_version('recipes')
+            self.assertEqual(get_versions(('recipes',)), before)
+        self.assertGreater(
+            get_versions(('recipes',))['recipes'], before['recipes']
+        )
+
+    def test_rolled_back_bump_is_discarded(self):
+        before = get_versions(('recipes',))
+        with self.assertRaises(ValueError):
+            with transaction.atomic():
+                bump_version('recipes')
+                raise ValueError
+        self.assertEqual(get_versions(('recipes',)), before)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def get(self, url, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_version_stamps_are_shared_between_processes(self):
+        etag = self.get('/api/tags/')['ETag']
+        self.assertEqual(self.get('/api/tags/', etag).status_code, 304)
+        caches['api'].clear()
+        self.assertEqual(self.get('/api/tags/', etag).status_code, 304)
+        Tag.objects.create(name='завтрак', slug='breakfast', color='#fff')
+        response = self.get('/api/tags/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_not_modified_reads_only_version_stamps(self):
+        etag = self.get('/api/recipes/')['ETag']
+        with self.assertNumQueries(1):
+            response = self.get('/api/recipes/', etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_last_modified_is_sent_for_settled_versions(self):
+        self.get('/api/tags/')
+        CacheVersion.objects.update(version=time.time() - 10)
+        last_modified = self.get('/api/tags/')['Last-Modified']
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_within_a_second_are_not_hidden(self):
+        self.get('/api/tags/')
+        now = time.time()
+        CacheVersion.objects.update(version=now)
+        self.assertNotIn('Last-Modified', self.get('/api/tags/'))
+        Tag.objects.create(name='завтрак', slug='breakfast', color='#fff')
+        response = self.client.get(
+            '/api/tags/', HTTP_IF_MODIFIED_SINCE=http_date(int(now))
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 1)
+
+    def test_detail_with_non_numeric_pk_is_not_found(self):
+        self.assertEqual(self.get('/api/recipes/abc/').status_code, 404)
+
+
+def api_cache_settings(backend, location):
+    return {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
+        },
+        'api': {'BACKEND': backend, 'LOCATION': location},
+    }
+
+
+class TokenCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.user = create_user('reader')
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, queries):
+        with self.assertNumQueries(queries):
+            user, _ = CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+        self.assertEqual(user, self.user)
+
+    def shared_cache(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        cache_settings = override_settings(
+            CACHES=api_cache_settings(
+                'django.core.cache.backends.filebased.FileBasedCache',
+                location.name,
+            )
+        )
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    def test_process_local_cache_is_not_used(self):
+        self.authenticate(1)
+        self.authenticate(1)
+
+    def test_shared_cache_is_used_and_invalidated(self):
+        self.shared_cache()
+        self.authenticate(1)
+        self.authenticate(0)
+        self.user.save()
+        self.authenticate(1)
+
+    def test_deactivated_user_is_rejected(self):
+        self.shared_cache()
+        self.authenticate(1)
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+
+    def test_entry_cached_before_commit_is_dropped(self):
+        self.shared_cache()
+        active = User.objects.get(pk=self.user.pk)
+        with transaction.atomic():
+            self.user.is_active = False
+            self.user.save()
+            caches['api'].set(token_cache_key(self.token.key), active)
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+
+    def test_inactive_cached_user_is_rejected(self):
+        self.shared_cache()
+        self.user.is_active = False
+        caches['api'].set(token_cache_key(self.token.key), self.user)
+        with self.assertRaises(AuthenticationFailed):
+            CachedTokenAuthentication().authenticate_credentials(
+                self.token.key
+            )
+        self.assertIsNone(caches['api'].get(token_cache_key(self.token.key)))
+
+
+class Base64UploadMemoryTests(TestCase):
+    def encode(self, size):
+        return 'data:image/png;base64,' + base64.b64encode(
+            os.urandom(size)
+        ).decode()
+
+    def peak_memory(self, data):
+        tracemalloc.start()
+        try:
+            decode_base64_image(data).close()
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return peak
+
+    def test_decoding_memory_is_bounded_by_spool_size(self):
+        size = settings.IMAGE_UPLOAD_MAX_BYTES - 1024 ** 2
+        peak = self.peak_memory(self.encode(size))
+        self.assertLess(peak, settings.FILE_UPLOAD_MAX_MEMORY_SIZE + 1024 ** 2)
+        self.assertLess(peak, settings.IMAGE_UPLOAD_MAX_BYTES // 2)
+
+    def test_oversized_upload_is_rejected_before_decoding(self):
+        data = self.encode(settings.IMAGE_UPLOAD_MAX_BYTES + 1024)
+        tracemalloc.start()
+        try:
+            with self.assertRaises(ValidationError):
+                decode_base64_image(data)
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.assertLess(peak, BASE64_CHUNK_SIZE)
+
+
+@override_settings(DATA_UPLOAD_MAX_MEMORY_SIZE=1000)
+class JSONBodyLimitTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('author'))
+
+    def post(self, text):
+        return self.client.post(
+            '/api/recipes/', {'name': 'рецепт', 'text': text}, format='json'
+        )
+
+    def test_body_over_limit_is_rejected(self):
+        self.assertEqual(self.post('x' * 5000).status_code, 413)
+        self.assertEqual(self.post('x' * 10).status_code, 400)
+
+    def test_body_without_content_length_is_limited(self):
+        stream = io.BytesIO(json.dumps({'text': 'x' * 5000}).encode())
+        with self.assertRaises(RequestTooLarge):
+            LimitedJSONParser().parse(stream)
+        stream = io.BytesIO(json.dumps({'text': 'x'}).encode())
+        self.assertEqual(LimitedJSONParser().parse(stream), {'text': 'x'})
+
+
+class ConnectionHealthCheckTests(TransactionTestCase):
+    def run_requests(self, count):
+        middleware = ConnectionHealthCheckMiddleware(
+            lambda request: HttpResponse()
+        )
+        request = RequestFactory().get('/')
+        connection.ensure_connection()
+        with mock.patch.object(
+            connection, 'is_usable', return_value=True
+        ) as is_usable:
+            for _ in range(count):
+                middleware(request)
+        return is_usable.call_count
+
+    def setUp(self):
+        connection.health_check_used_at = None
+
+    def test_busy_connection_is_not_checked(self):
+        self.assertEqual(self.run_requests(5), 1)
+
+    @override_settings(DB_CONN_HEALTH_CHECK_IDLE=0)
+    def test_zero_interval_checks_every_request(self):
+        self.assertEqual(self.run_requests(5), 5)
+
+
+class IngredientImportTests(TestCase):
+    rows = (
+        ('мука', 'кг'),
+        ('соль', 'г'),
+        ('сахар', 'г'),
+        ('соль', 'щепотка'),
+    )
+    expected = {'мука': 'кг', 'соль': 'щепотка', 'сахар': 'г'}
+
+    def setUp(self):
+        Ingredient.objects.create(name='мука', measurement_unit='г')
+
+    def units(self):
+        return dict(Ingredient.objects.values_list('name', 'measurement_unit'))
+
+    def command(self):
+        return IngredientsCommand(stdout=io.StringIO())
+
+    def test_command_creates_and_updates_units(self):
+        with tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf8'
+        ) as file:
+            file.writelines(f'{name},{unit}\n' for name, unit in self.rows)
+            file.flush()
+            for _ in range(2):
+                call_command(
+                    'ingredients_to_postgres', file.name, stdout=io.StringIO()
+                )
+                self.assertEqual(self.units(), self.expected)
+
+    def test_bulk_loader_updates_units(self):
+        self.assertEqual(self.command().load_bulk(self.rows, 2), 4)
+        self.assertEqual(self.units(), self.expected)
+
+    @skipUnless(connection.vendor == 'postgresql', 'COPY requires PostgreSQL')
+    def test_postgres_loader_updates_units(self):
+        self.assertEqual(self.command().load_postgres(self.rows, 2), 4)
+        self.assertEqual(self.units(), self.expected)
+
+
+class RelationToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.recipes = [
+            create_recipe(
+                cls.author, f'рецепт {index}', ((cls.ingredient, 100),)
+            )
+            for index in range(4)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConsistent(self):
+        for model, target, field, counter in COUNTERS:
+            stored = dict(target.objects.values_list('pk', counter))
+            expected = dict(
+                target.objects.annotate(
+                    expected=count_subquery(model, field)
+                ).values_list('pk', 'expected')
+            )
+            self.assertEqual(stored, expected, counter)
+        self.assertEqual(check_shopping_carts(), [])
+
+    def toggle(self, method, url, status_code):
+        response = getattr(self.client, method)(url)
+        self.assertEqual(response.status_code, status_code)
+        self.assertConsistent()
+
+    def test_favorite_and_shopping_cart_toggles(self):
+        for action in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipes[0].pk}/{action}/'
+            self.toggle('post', url, 201)
+            self.toggle('post', url, 400)
+            self.toggle('delete', url, 204)
+            self.toggle('delete', url, 400)
+            self.toggle('delete', f'/api/recipes/abc/{action}/', 404)
+            self.toggle('post', f'/api/recipes/0/{action}/', 404)
+
+    def test_batch_toggles(self):
+        recipe_ids = [recipe.pk for recipe in self.recipes]
+        for action in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{action}/'
+            response = self.client.post(
+                url, {'recipes': recipe_ids[:2]}, format='json'
+            )
+            self.assertEqual(response.data['added'], recipe_ids[:2])
+            self.assertConsistent()
+            response = self.client.post(
+                url, {'recipes': recipe_ids}, format='json'
+            )
+            self.assertEqual(response.data['added'], recipe_ids[2:])
+            self.assertConsistent()
+            response = self.client.delete(
+                url, {'recipes': recipe_ids[1:]}, format='json'
+            )
+            self.assertEqual(response.data['removed'], 3)
+            self.assertConsistent()
+        self.assertEqual(
+            ShoppingCartTotal.objects.get(user=self.user).amount, 100
+        )
+
+    def test_subscribe_toggle_updates_feed(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.toggle('post', url, 201)
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(), 4)
+        self.toggle('post', url, 400)
+        self.toggle('delete', url, 204)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        self.toggle('delete', url, 400)
+        self.toggle('delete', '/api/users/abc/subscribe/', 404)
+
+    def test_orm_deletes_run_the_same_side_effects(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        ShoppingList.objects.create(user=self.user, recipe=self.recipes[0])
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertConsistent()
+        self.recipes[0].delete()
+        self.assertConsistent()
+        Follow.objects.all().delete()
+        self.assertConsistent()
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'concurrent writers')
+class ConcurrentRelationTests(TransactionTestCase):
+    @mock.patch.object(feed_workers, 'size', 0)
+    def test_concurrent_batch_adds_count_each_row_once(self):
+        user = create_user('reader')
+        author = create_user('author')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        recipe_ids = [
+            create_recipe(author, f'рецепт {index}', ((ingredient, 100),)).pk
+            for index in range(20)
+        ]
+        barrier = threading.Barrier(2)
+        added = []
+
+        def add():
+            try:
+                barrier.wait()
+                added.extend(
+                    add_relations(ShoppingList, user, 'recipe_id', recipe_ids)
+                )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=add) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertCountEqual(added, recipe_ids)
+        self.assertEqual(
+            set(Recipe.objects.values_list('in_carts_count', flat=True)), {1}
+        )
+        self.assertEqual(ShoppingCartTotal.objects.get(user=user).amount, 2000)
+
+
+class RecipeSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        beet = Ingredient.objects.create(name='свекла', measurement_unit='г')
+        cls.millet = Ingredient.objects.create(
+            name='пшено', measurement_unit='г'
+        )
+        cls.soup = create_recipe(
+            cls.user, 'борщ', ((beet, 300),), text='густой суп'
+        )
+        cls.baked = create_recipe(
+            cls.user, 'запечённая свекла', ((beet, 500),), text='просто'
+        )
+        cls.porridge = create_recipe(
+            cls.user,
+            'каша',
+            ((cls.millet, 200),),
+            text='подавать со свекла и маслом',
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            '/api/recipes/', {'search': query, **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_results_are_ranked_by_field(self):
+        self.assertEqual(
+            self.search('свекла'),
+            [self.baked.pk, self.soup.pk, self.porridge.pk],
+        )
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search('борщ свекла'), [self.soup.pk])
+        self.assertEqual(self.search('торт'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_search_combines_with_filters(self):
+        self.assertEqual(
+            self.search('свекла', author=create_user('other').pk), []
+        )
+
+    @skipUnless(
+        connection.vendor == 'postgresql', 'tsvector search is PostgreSQL only'
+    )
+    def test_triggers_keep_search_vector_current(self):
+        self.assertEqual(self.search('свеклой'), self.search('свекла'))
+        self.assertEqual(self.search('гречка'), [])
+        self.millet.name = 'гречка'
+        self.millet.save()
+        self.assertEqual(self.search('гречка'), [self.porridge.pk])
+        RecipeIngredient.objects.create(
+            recipe=self.soup, ingredient=self.millet, amount=10
+        )
+        self.assertEqual(
+            self.search('гречка'), [self.porridge.pk, self.soup.pk]
+        )
+        RecipeIngredient.objects.filter(recipe=self.soup).delete()
+        self.assertEqual(self.search('гречка'), [self.porridge.pk])
+        self.assertEqual(self.search('запечённая'), [self.baked.pk])
+        self.baked.name = 'печёный картофель'
+        self.baked.save()
+        self.assertEqual(self.search('запечённая'), [])
+        self.assertEqual(self.search('картофель'), [self.baked.pk])
+
+
+class FeedBackfillMigrationTests(TestCase):
+    @override_settings(FEED_BACKFILL=3)
+    def test_backfill_is_capped_per_author(self):
+        readers = [create_user(f'reader{index}') for index in range(2)]
+        authors = [create_user(f'author{index}') for index in range(2)]
+        for author in authors:
+            for index in range(5):
+                create_recipe(author, f'рецепт {index}', ())
+            for reader in readers:
+                Follow.objects.create(user=reader, author=author)
+        FeedEntry.objects.all().delete()
+        migration = importlib.import_module(
+            'recipes.migrations.0011_feed_entries'
+        )
+        migration.populate_feeds(apps, None)
+        for reader in readers:
+            for author in authors:
+                self.assertEqual(
+                    list(
+                        FeedEntry.objects.filter(
+                            user=reader, recipe__author=author
+                        )
+                        .order_by('-pub_date', '-recipe_id')
+                        .values_list('recipe_id', flat=True)
+                    ),
+                    list(
+                        Recipe.objects.filter(author=author)
+                        .order_by('-pub_date', '-id')
+                        .values_list('id', flat=True)[:3]
+                    ),
+                )
+
+
+class SimilarRecipesEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipes = [
+            create_recipe(cls.author, f'рецепт {index}', ())
+            for index in range(4)
+        ]
+        RecipeNeighbor.objects.bulk_create(
+            RecipeNeighbor(
+                recipe=cls.recipes[0],
+                neighbor=neighbor,
+                score=1 / rank,
+                rank=rank,
+            )
+            for rank, neighbor in enumerate(reversed(cls.recipes[1:]), 1)
+        )
+
+    def test_neighbors_are_returned_in_rank_order(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f'/api/recipes/{self.recipes[0].pk}/similar/'
+            )
+        self.assertEqual(
+            [recipe['id'] for recipe in response.data],
+            [recipe.pk for recipe in reversed(self.recipes[1:])],
+        )
+
+    def test_recipe_without_neighbors(self):
+        response = self.client.get(
+            f'/api/recipes/{self.recipes[1].pk}/similar/'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_unknown_recipe_is_not_found(self):
+        for pk in ('0', 'abc'):
+            with self.subTest(pk=pk):
+                response = self.client.get(f'/api/recipes/{pk}/similar/')
+                self.assertEqual(response.status_code, 404)
+
+
+@skipUnless(similarity_available(), 'numpy and scipy are required')
+class SimilarRecipesRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(12)
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.author,
+                f'рецепт {index}',
+                (
+                    (cls.ingredients[2 * index], 10),
+                    (cls.ingredients[2 * index + 1], 10),
+                    (cls.ingredients[(2 * index + 2) % 12], 10),
+                ),
+            )
+            for index in range(6)
+        ]
+
+    def neighbors(self, recipe):
+        return list(
+            RecipeNeighbor.objects.filter(recipe=recipe)
+            .order_by('rank')
+            .values_list('neighbor_id', flat=True)
+        )
+
+    def test_saving_a_recipe_does_not_recompute_neighbors(self):
+        build_similar_recipes()
+        before = list(RecipeNeighbor.objects.values_list('pk', flat=True))
+        self.recipes[0].save()
+        self.assertEqual(
+            list(RecipeNeighbor.objects.values_list('pk', flat=True)), before
+        )
+        self.assertEqual(list(stale_recipes()), [self.recipes[0]])
+
+    def test_changed_recipe_and_its_neighbors_are_refreshed(self):
+        self.assertEqual(build_similar_recipes(), 6)
+        first, _, _, target, *_ = self.recipes
+        self.assertNotEqual(self.neighbors(first)[:1], [target.pk])
+        untouched = self.neighbors(self.recipes[1])
+        self.assertIn(target.pk, self.neighbors(self.recipes[2]))
+        RecipeIngredient.objects.filter(recipe=target).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=target, ingredient=ingredient, amount=10)
+            for ingredient in self.ingredients[:2]
+        )
+        target.save()
+        self.assertEqual(list(stale_recipes()), [target])
+        self.assertGreater(refresh_similar_recipes(), 1)
+        self.assertEqual(self.neighbors(target)[0], first.pk)
+        self.assertEqual(self.neighbors(first)[0], target.pk)
+        self.assertEqual(self.neighbors(self.recipes[2]), [self.recipes[1].pk])
+        self.assertEqual(self.neighbors(self.recipes[1]), untouched)
+        self.assertFalse(stale_recipes().exists())
+        self.assertEqual(refresh_similar_recipes(), 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'advisory locks')
+    def test_concurrent_run_is_skipped(self):
+        import psycopg2
+
+        other = psycopg2.connect(**connection.get_connection_params())
+        try:
+            with other.cursor() as cursor:
+                cursor.execute(
+                    'SELECT pg_advisory_lock(%s)', (SIMILAR_LOCK_KEY,)
+                )
+            output = io.StringIO()
+            call_command('build_similar_recipes', stdout=output)
+            self.assertIn('skipped', output.getvalue())
+            self.assertFalse(RecipeNeighbor.objects.exists())
+        finally:
+            other.close()
+
+
+class BulkWriteBatchTests(TestCase):
+    size = 600
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        Recipe.objects.bulk_create(
+            Recipe(author=cls.author, name=f'рецепт {index}', cooking_time=10)
+            for index in range(cls.size)
+        )
+        cls.recipes = list(Recipe.objects.order_by('pk'))
+
+    def test_shopping_carts_are_rebuilt(self):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {index}', measurement_unit='г')
+            for index in range(self.size)
+        )
+        recipe = create_recipe(
+            self.author,
+            'большой рецепт',
+            ((ingredient, 1) for ingredient in Ingredient.objects.all()),
+        )
+        ShoppingList.objects.create(user=self.user, recipe=recipe)
+        ShoppingCartTotal.objects.all().delete()
+        rebuild_shopping_carts()
+        self.assertEqual(
+            ShoppingCartTotal.objects.filter(user=self.user).count(),
+            self.size,
+        )
+        self.assertEqual(check_shopping_carts(), [])
+
+    def test_feed_is_filled(self):
+        add_to_feed(
+            self.user.pk,
+            ((recipe.pk, recipe.pub_date) for recipe in self.recipes),
+        )
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user).count(), self.size
+        )
+
+    def test_neighbors_are_stored(self):
+        first, *others = self.recipes
+        create_neighbors(
+            ((first.pk, [(recipe.pk, 1.0) for recipe in others]),)
+        )
+        self.assertEqual(
+            RecipeNeighbor.objects.filter(recipe=first).count(), self.size - 1
+        )
+
+
+class CounterSaveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author, 'рецепт', ())
+
+    def test_password_change_keeps_counters(self):
+        author = User.objects.get(pk=self.author.pk)
+        Follow.objects.create(user=self.reader, author=self.author)
+        client = APIClient()
+        client.force_authenticate(author)
+        response = client.post(
+            '/api/users/set_password/',
+            {
+                'current_password': 'password-12345',
+                'new_password': 'password-67890',
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        author.refresh_from_db()
+        self.assertTrue(author.check_password('password-67890'))
+        self.assertEqual(author.followers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_recipe_update_keeps_counters(self):
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingList.objects.create(user=self.reader, recipe=self.recipe)
+        RecipeSerializer().update(recipe, {'name': 'новое название'})
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.name, 'новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.in_carts_count, 1)
+
+
+class RecipeTransferTests(TestCase):
+    url = '/api/recipes/bulk/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user('admin')
+        cls.admin.role = settings.ADMIN
+        cls.admin.save(update_fields=('role',))
+        cls.tag = Tag.objects.create(
+            name='завтрак', slug='breakfast', color='#fff'
+        )
+        cls.flour = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.salt = Ingredient.objects.create(
+            name='соль', measurement_unit='г'
+        )
+        for index in range(2):
+            recipe = create_recipe(
+                cls.admin,
+                f'рецепт {index}',
+                ((cls.flour, 100 + index), (cls.salt, 5)),
+                text=f'описание {index}',
+            )
+            recipe.tags.add(cls.tag)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def load(self, lines):
+        response = self.client.post(
+            self.url,
+            '\n'.join(lines),
+            content_type='application/x-ndjson',
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def test_round_trip(self):
+        lines = self.export()
+        self.assertEqual(len(lines), 2)
+        Recipe.objects.all().delete()
+        self.assertEqual(self.load(lines), {'created': 2, 'errors': []})
+        self.assertEqual(self.export(), lines)
+
+    def test_errors_are_reported_per_line(self):
+        record = json.loads(self.export()[0])
+        Recipe.objects.all().delete()
+        lines = [
+            json.dumps(record),
+            'не json',
+            json.dumps({**record, 'name': 'другой', 'tags': ['lunch']}),
+            '',
+            json.dumps({**record, 'author': 'nobody@example.com'}),
+            json.dumps(record),
+        ]
+        result = self.load(lines)
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(
+            [
+                (error['line'], list(error['errors']))
+                for error in result['errors']
+            ],
+            [
+                (2, ['non_field_errors']),
+                (3, ['tags']),
+                (5, ['author']),
+                (6, ['name']),
+            ],
+        )
+
+    def test_deleted_ingredient_is_skipped(self):
+        self.salt.delete()
+        records = [json.loads(line) for line in self.export()]
+        self.assertEqual(len(records), 2)
+        for record in records:
+            self.assertEqual(
+                [item['name'] for item in record['ingredients']], ['мука']
+            )
+
+
+class ASGIApplicationTests(TransactionTestCase):
+    def test_request_finished_is_sent(self):
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            messages.append(message)
+
+        finished = mock.Mock()
+        request_finished.connect(finished)
+        try:
+            with mock.patch.dict(connection.settings_dict, CONN_MAX_AGE=0):
+                async_to_sync(asgi_application)(
+                    {
+                        'type': 'http',
+                        'method': 'GET',
+                        'path': '/api/tags/',
+                        'query_string': b'',
+                        'http_version': '1.1',
+                        'server': ('testserver', 80),
+                        'headers': [(b'host', b'testserver')],
+                    },
+                    receive,
+                    send,
+                )
+        finally:
+            request_finished.disconnect(finished)
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(finished.call_count, 1)
+
+
+class FeedFanOutTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.author = create_user('author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.delivered = create_recipe(cls.author, 'старый рецепт', ())
+        FeedEntry.objects.create(
+            user=cls.reader,
+            recipe=cls.delivered,
+            pub_date=cls.delivered.pub_date,
+        )
+        Recipe.objects.filter(pk=cls.delivered.pk).update(fanned_out=True)
+
+    def feed(self):
+        return set(
+            FeedEntry.objects.filter(user=self.reader).values_list(
+                'recipe_id', flat=True
+            )
+        )
+
+    def test_lost_fan_out_is_delivered_by_pending_run(self):
+        with mock.patch.object(feed_workers, 'submit'):
+            recipe = create_recipe(self.author, 'новый рецепт', ())
+        self.assertEqual(self.feed(), {self.delivered.pk})
+        output = io.StringIO()
+        call_command('rebuild_feeds', '--pending', stdout=output)
+        self.assertIn('Fanned out 1', output.getvalue())
+        self.assertEqual(self.feed(), {self.delivered.pk, recipe.pk})
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.fanned_out)
+        call_command('rebuild_feeds', '--pending', stdout=output)
+        self.assertEqual(FeedEntry.objects.count(), 2)
+
+    def test_failed_fan_out_stays_pending(self):
+        recipe = create_recipe(self.author, 'новый рецепт', ())
+        with mock.patch.object(
+            FeedEntry.objects, 'bulk_create', side_effect=DatabaseError
+        ), self.assertLogs('foodgram.workers', 'ERROR'):
+            feed_workers.process((recipe.pk,))
+        recipe.refresh_from_db()
+        self.assertFalse(recipe.fanned_out)
+        self.assertEqual(fan_out_pending(), 1)
+        self.assertEqual(self.feed(), {self.delivered.pk, recipe.pk})
+
+
+def encode_image(width, height):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 100, 50)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@mock.patch.object(feed_workers, 'size', 0)
+@mock.patch.object(image_workers, 'size', 0)
+class ImageVariantTests(TransactionTestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.author = create_user('author')
+        self.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def post(self, image):
+        return self.client.post(
+            '/api/recipes/',
+            {
+                'name': 'рецепт',
+                'text': 'описание',
+                'cooking_time': 10,
+                'tags': [],
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 100}],
+                'image': image,
+            },
+            format='json',
+        )
+
+    def variant_sizes(self, recipe):
+        sizes = []
+        for _, field, _ in IMAGE_VARIANTS:
+            with getattr(recipe, field).open('rb') as file:
+                sizes.append(max(Image.open(file).size))
+        return sizes
+
+    def test_variants_are_built_after_commit(self):
+        response = self.post(encode_image(2000, 1000))
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertFalse(needs_variants(recipe))
+        self.assertEqual(
+            self.variant_sizes(recipe),
+            [size for _, _, size in IMAGE_VARIANTS],
+        )
+
+    def test_invalid_image_is_rejected_in_request(self):
+        response = self.post('data:image/png;base64,' + 'A' * 400)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_lost_job_is_built_by_command(self):
+        with mock.patch.object(image_workers, 'submit'):
+            response = self.post(encode_image(300, 200))
+        recipe = Recipe.objects.get(pk=response.data['id'])
+        self.assertTrue(needs_variants(recipe))
+        variants = self.client.get(f'/api/recipes/{recipe.pk}/').data[
+            'image_variants'
+        ]
+        self.assertEqual(len(set(variants.values())), 1)
+        output = io.StringIO()
+        call_command('build_image_variants', stdout=output)
+        self.assertIn('Built variants for 1', output.getvalue())
+        recipe.refresh_from_db()
+        self.assertFalse(needs_variants(recipe))
+        self.assertEqual(self.variant_sizes(recipe), [160, 300, 300])
+
+
+class TagFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.breakfast = Tag.objects.create(
+            name='завтрак', slug='breakfast', color='#fff'
+        )
+        cls.both = create_recipe(author, 'каша', ())
+        cls.both.tags.add(cls.breakfast)
+        cls.breakfast_only = create_recipe(author, 'омлет', ())
+        cls.breakfast_only.tags.add(cls.breakfast)
+
+    def setUp(self):
+        tag_slug_cache.invalidate()
+
+    def ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.data['results']}
+
+    def test_tag_created_after_cache_load_is_found(self):
+        self.assertEqual(
+            self.ids('tags=breakfast'), {self.both.pk, self.breakfast_only.pk}
+        )
+        quick = Tag.objects.create(name='быстро', slug='quick', color='#000')
+        self.both.tags.add(quick)
+        self.assertNotIn('quick', tag_slug_cache.get())
+        self.assertEqual(self.ids('tags=breakfast&tags=quick'), {self.both.pk})
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=quick&tags_mode=any'),
+            {self.both.pk, self.breakfast_only.pk},
+        )
+        self.assertIn('quick', tag_slug_cache.get())
+
+    def test_unknown_tag(self):
+        self.assertEqual(self.ids('tags=breakfast&tags=unknown'), set())
+        self.assertEqual(
+            self.ids('tags=breakfast&tags=unknown&tags_mode=any'),
+            {self.both.pk, self.breakfast_only.pk},
+        )
+
+
+class RecipeListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.author = create_user('author')
+        cls.tag = Tag.objects.create(name='обед', slug='lunch', color='#fff')
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(3)
+        ]
+        cls.recipes = []
+        for index in range(6):
+            recipe = create_recipe(
+                cls.author,
+                f'рецепт {index}',
+                ((cls.ingredients[0], 10), (cls.ingredients[1], 5)),
+            )
+            recipe.tags.add(cls.tag)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_page_query_count(self):
+        for user, queries in ((None, 5), (self.user, 5)):
+            self.client.force_authenticate(user)
+            self.client.get('/api/recipes/')
+            caches['api'].clear()
+            with self.assertNumQueries(queries):
+                response = self.client.get('/api/recipes/')
+            self.assertEqual(len(response.data['results']), 6)
+            for recipe in response.data['results']:
+                self.assertEqual(len(recipe['ingredients']), 2)
+                self.assertEqual(len(recipe['tags']), 1)
+
+    def test_orphaned_ingredients_are_skipped(self):
+        self.ingredients[0].delete()
+        recipe = self.recipes[0]
+        response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(
+            [row['id'] for row in response.data['ingredients']],
+            [self.ingredients[1].pk],
+        )
+
+    def test_update_response_is_rendered(self):
+        recipe = self.recipes[0]
+        Favorite.objects.create(user=self.author, recipe=recipe)
+        self.client.force_authenticate(self.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.pk}/',
+            {
+                'name': 'новое название',
+                'ingredients': [{'id': self.ingredients[2].pk, 'amount': 7}],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'новое название')
+        self.assertEqual(
+            [
+                (row['id'], row['amount'])
+                for row in response.data['ingredients']
+            ],
+            [(self.ingredients[2].pk, 7)],
+        )
+        self.assertEqual(len(response.data['tags']), 1)
+        self.assertTrue(response.data['is_favorited'])
@@ -0,0 +1,238 @@
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+
+from api.cache import bump_version
+from recipes.models import (
+    NAMING_LENGTH,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    Tag,
+)
+from users.models import User
+
+TRANSFER_CHUNK_SIZE = 500
+
+
+class RecordError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def export_recipes(queryset, chunk_size=TRANSFER_CHUNK_SIZE):
+    recipe_ids = list(queryset.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(recipe_ids), chunk_size):
+        recipes = (
+            Recipe.objects.filter(
+                pk__in=recipe_ids[start : start + chunk_size]
+            )
+            .order_by('id')
+            .select_related('author')
+            .prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.only('id', 'slug')),
+                Prefetch(
+                    'recipeingredient',
+                    queryset=RecipeIngredient.objects.filter(
+                        ingredient__isnull=False
+                    )
+                    .select_related('ingredient')
+                    .order_by('ingredient__name'),
+                ),
+            )
+        )
+        for recipe in recipes:
+            yield {
+                'name': recipe.name,
+                'author': recipe.author.email,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name or None,
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {
+                        'name': item.ingredient.name,
+                        'measurement_unit': item.ingredient.measurement_unit,
+                        'amount': item.amount,
+                    }
+                    for item in recipe.recipeingredient.all()
+                ],
+            }
+
+
+def positive_integer(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+class RecipeImporter:
+    def __init__(self, chunk_size=TRANSFER_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = dict(Ingredient.objects.values_list('name', 'id'))
+        self.authors = {}
+        self.created = 0
+        self.errors = []
+
+    def run(self, lines):
+        numbered = enumerate(lines, 1)
+        while True:
+            chunk = list(islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+        if self.created:
+            bump_version('recipes')
+        self.errors.sort(key=lambda error: error['line'])
+        return {'created': self.created, 'errors': self.errors}
+
+    def error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def parse(self, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise RecordError({'non_field_errors': ['Неверный JSON']})
+        if not isinstance(record, dict):
+            raise RecordError({'non_field_errors': ['Ожидается объект']})
+        errors = {}
+        name = record.get('name')
+        if not isinstance(name, str) or not 0 < len(name) <= NAMING_LENGTH:
+            errors['name'] = ['Укажите название рецепта']
+        if not isinstance(record.get('author'), str):
+            errors['author'] = ['Укажите email автора']
+        if not positive_integer(record.get('cooking_time')):
+            errors['cooking_time'] = [
+                'Время приготовления должно быть не меньше 1'
+            ]
+        if not isinstance(record.get('text') or '', str):
+            errors['text'] = ['Описание должно быть строкой']
+        if not isinstance(record.get('image') or '', str):
+            errors['image'] = ['Укажите путь к фото']
+        try:
+            record['tags'] = self.resolve_tags(record.get('tags') or [])
+        except RecordError as error:
+            errors['tags'] = error.errors
+        try:
+            record['ingredients'] = self.resolve_ingredients(
+                record.get('ingredients')
+            )
+        except RecordError as error:
+            errors['ingredients'] = error.errors
+        if errors:
+            raise RecordError(errors)
+        return record
+
+    def resolve_tags(self, slugs):
+        if not isinstance(slugs, list):
+            raise RecordError(['Передайте список слагов тегов'])
+        missing = [slug for slug in slugs if slug not in self.tags]
+        if missing:
+            raise RecordError([f'Теги не найдены: {missing}'])
+        return list(dict.fromkeys(self.tags[slug] for slug in slugs))
+
+    def resolve_ingredients(self, items):
+        if not isinstance(items, list) or not items:
+            raise RecordError(['Передайте список ингредиентов'])
+        amounts = {}
+        for item in items:
+            if not isinstance(item, dict) or not positive_integer(
+                item.get('amount')
+            ):
+                raise RecordError(
+                    ['Укажите название и количество ингредиента']
+                )
+            ingredient_id = self.ingredients.get(item.get('name'))
+            if ingredient_id is None:
+                raise RecordError(
+                    [f'Ингредиент не найден: {item.get("name")}']
+                )
+            if ingredient_id in amounts:
+                raise RecordError(['Ингредиенты не должны повторяться'])
+            amounts[ingredient_id] = item['amount']
+        return amounts
+
+    def resolve_authors(self, records):
+        missing = {
+            record['author']
+            for _, record in records
+            if record['author'] not in self.authors
+        }
+        if missing:
+            self.authors.update(
+                User.objects.filter(email__in=missing).values_list(
+                    'email', 'id'
+                )
+            )
+
+    def import_chunk(self, chunk):
+        records = []
+        for line, text in chunk:
+            if not text.strip():
+                continue
+            try:
+                records.append((line, self.parse(text)))
+            except RecordError as error:
+                self.error(line, error.errors)
+        if not records:
+            return
+        self.resolve_authors(records)
+        existing = set(
+            Recipe.objects.filter(
+                author_id__in={
+                    self.authors.get(record['author'])
+                    for _, record in records
+                },
+                name__in={record['name'] for _, record in records},
+            ).values_list('author_id', 'name')
+        )
+        recipes = []
+        for line, record in records:
+            author_id = self.authors.get(record['author'])
+            if author_id is None:
+                self.error(line, {'author': ['Пользователь не найден']})
+                continue
+            if (author_id, record['name']) in existing:
+                self.error(
+                    line,
+                    {'name': ['У автора уже есть рецепт с таким названием']},
+                )
+                continue
+            existing.add((author_id, record['name']))
+            recipes.append((line, author_id, record))
+        try:
+            with transaction.atomic():
+                self.save_chunk(recipes)
+        except IntegrityError as error:
+            for line, _, _ in recipes:
+                self.error(line, {'non_field_errors': [str(error)]})
+            return
+        self.created += len(recipes)
+
+    def save_chunk(self, recipes):
+        recipe_ingredients = []
+        recipe_tags = []
+        for _, author_id, record in recipes:
+            recipe = Recipe.objects.create(
+                author_id=author_id,
+                name=record['name'],
+                text=record.get('text') or '',
+                cooking_time=record['cooking_time'],
+                image=record.get('image') or None,
+            )
+            recipe_ingredients.extend(
+                RecipeIngredient(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for ingredient_id, amount in record['ingredients'].items()
+            )
+            recipe_tags.extend(
+                RecipeTag(recipe=recipe, tag_id=tag_id)
+                for tag_id in record['tags']
+            )
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        RecipeTag.objects.bulk_create(recipe_tags)
@@ -1,31 +1,79 @@
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, permissions, status, viewsets
+from rest_framework import (
+    filters,
+    permissions,
+    serializers,
+    status,
+    viewsets,
+)
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 
-from api.filters import FavoriteShoppingFilter, IngredientFilter
-from api.permissions import AuthorOrAuthenticated
+from api.cache import CachedResponseMixin
+from api.filters import (
+    FavoriteShoppingFilter,
+    IngredientFilter,
+    RecipeSearchFilter,
+)
+from api.pagination import RecipePagination, TimelinePagination
+from api.parsers import LimitedJSONParser
+from api.permissions import AdminOnly, AuthorOrAuthenticated
+from api.renderers import SHOPPING_CART_RENDERERS, NDJSONRenderer
 from api.serializers import (
     FavoriteOrShoppingSerializer,
     IngredientSerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     TagSerializer,
+    recipe_prefetches,
+)
+from recipes.autocomplete import ingredient_index
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    ShoppingList,
+    Tag,
 )
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingList, Tag
+from recipes.feed import pull_feed
+from recipes.relations import (
+    add_relation,
+    add_relations,
+    remove_relation,
+    remove_relations,
+)
+from recipes.shopping_cart import aggregate_shopping_cart
+from recipes.transfer import RecipeImporter, export_recipes
+from users.models import Follow
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+class RecipeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = RecipeSerializer
-    parser_classes = (MultiPartParser, JSONParser)
-    pagination_class = PageNumberPagination
+    cache_namespaces = (
+        'recipes',
+        'tags',
+        'ingredients',
+        'users',
+        'favorites',
+    )
+    detail_namespaces = (
+        'tags',
+        'ingredients',
+        'users',
+    )
+    parser_classes = (MultiPartParser, LimitedJSONParser)
+    pagination_class = RecipePagination
     permission_classes = (AuthorOrAuthenticated,)
     filterset_class = FavoriteShoppingFilter
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (
+        DjangoFilterBackend,
+        RecipeSearchFilter,
+    )
     filterset_fields = (
         'author',
         'tags',
@@ -33,18 +81,96 @@ class RecipeViewSet(viewsets.ModelViewSet):
         'is_in_shopping_cart',
     )
 
-    def _process(self, request, model, recipe, query):
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            *recipe_prefetches()
+        )
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingList.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            ),
+        )
+
+    def refetch(self, serializer):
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        self.refetch(serializer)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        self.refetch(serializer)
+
+    def get_renderers(self):
+        if self.action == 'bulk' and self.request.method == 'GET':
+            return [NDJSONRenderer()]
+        return super().get_renderers()
+
+    def get_last_modified(self, request, **kwargs):
+        if not self.detail:
+            return None
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            return None
+        updated_at = (
+            Recipe.objects.filter(pk=pk)
+            .values_list('updated_at', flat=True)
+            .first()
+        )
+        return updated_at.timestamp() if updated_at else None
+
+    def _process(self, request, model, pk):
         user = request.user
         if request.method == 'DELETE':
-            query.get(recipe=recipe).delete()
-            return Response('Объект удален', status=status.HTTP_200_OK)
-        if query.filter(recipe=recipe).exists():
+            if not remove_relation(model, user, 'recipe_id', pk):
+                return Response(
+                    'Рецепта нет в списке', status=status.HTTP_400_BAD_REQUEST
+                )
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        recipe = get_object_or_404(Recipe, id=pk)
+        if not add_relation(model, user, 'recipe_id', recipe.pk):
             return Response(
                 'Уже есть в списке', status=status.HTTP_400_BAD_REQUEST
             )
-        instance = model.objects.create(user=user, recipe=recipe)
-        serializer = FavoriteOrShoppingSerializer(recipe)
-        return Response(serializer.data)
+        serializer = FavoriteOrShoppingSerializer(
+            recipe, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def _process_batch(self, request, model):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'DELETE':
+            removed = remove_relations(
+                model, request.user, 'recipe_id', recipe_ids
+            )
+            return Response({'removed': removed}, status=status.HTTP_200_OK)
+        found = set(
+            Recipe.objects.filter(pk__in=recipe_ids).values_list(
+                'pk', flat=True
+            )
+        )
+        missing = [pk for pk in recipe_ids if pk not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {'recipes': f'Рецепты не найдены: {missing}'}
+            )
+        added = add_relations(model, request.user, 'recipe_id', recipe_ids)
+        return Response({'added': added}, status=status.HTTP_201_CREATED)
 
     @action(
         detail=True,
@@ -55,8 +181,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def favorite(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        return self._process(request, Favorite, recipe, request.user.favorite)
+        return self._process(request, Favorite, pk)
 
     @action(
         detail=True,
@@ -67,46 +192,113 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(permissions.IsAuthenticated,),
     )
     def shopping_cart(self, request, pk):
-        recipe = get_object_or_404(Recipe, id=pk)
-        return self._process(
-            request, ShoppingList, recipe, request.user.shopping
+        return self._process(request, ShoppingList, pk)
+
+    @action(
+        detail=False,
+        methods=(
+            'post',
+            'delete',
+        ),
+        url_path='favorite',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def favorite_batch(self, request):
+        return self._process_batch(request, Favorite)
+
+    @action(
+        detail=False,
+        methods=(
+            'post',
+            'delete',
+        ),
+        url_path='shopping_cart',
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def shopping_cart_batch(self, request):
+        return self._process_batch(request, ShoppingList)
+
+    @action(detail=True, methods=('get',))
+    def similar(self, request, pk):
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        recipes = Recipe.objects.filter(similar_to__recipe_id=pk).order_by(
+            'similar_to__rank'
+        )
+        serializer = FavoriteOrShoppingSerializer(
+            recipes, many=True, context={'request': request}
         )
+        if not serializer.data:
+            get_object_or_404(Recipe, id=pk)
+        return Response(serializer.data)
 
     @action(
         detail=False,
         methods=('get',),
         permission_classes=(permissions.IsAuthenticated,),
+        pagination_class=TimelinePagination,
+    )
+    def feed(self, request):
+        pull_feed(request.user.pk)
+        queryset = (
+            self.filter_queryset(self.get_queryset())
+            .filter(feed_entries__user=request.user)
+            .annotate(feed_pub_date=F('feed_entries__pub_date'))
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=('get',),
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=SHOPPING_CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
-        user = request.user
-        content = 'Foodgram\n' + 'Shopping list\n'
-        recipes = user.shopping.select_related('recipe').prefetch_related(
-            'recipe__recipeingredient'
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(aggregate_shopping_cart(request.user)),
+            content_type=content_type,
         )
-        shopping_list = {}
-        for instance in recipes:
-            objects = instance.recipe.recipeingredient.values(
-                'ingredient_id', 'amount'
-            )
-            for object in objects:
-                ingredient = get_object_or_404(
-                    Ingredient, id=object['ingredient_id']
-                )
-                if ingredient.name not in shopping_list:
-                    shopping_list[ingredient.name] = [
-                        object['amount'],
-                        ingredient.measurement_unit,
-                    ]
-                else:
-                    shopping_list[ingredient.name][0] += object['amount']
-        for name, amount in shopping_list.items():
-            content += f'{name} - {amount[0]} {amount[1]}\n'
-        return HttpResponse(content, content_type='text/plain')
-
-
-class IngredientViewSet(viewsets.ModelViewSet):
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
+        return response
+
+    @action(
+        detail=False,
+        methods=(
+            'get',
+            'post',
+        ),
+        permission_classes=(AdminOnly,),
+    )
+    def bulk(self, request):
+        if request.method == 'POST':
+            return Response(RecipeImporter().run(request.stream or ()))
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(
+                export_recipes(self.filter_queryset(Recipe.objects.all()))
+            ),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}',
+        )
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"'
+        )
+        return response
+
+
+class IngredientViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    cache_namespaces = ('ingredients',)
     filter_backends = (
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -115,10 +307,28 @@ class IngredientViewSet(viewsets.ModelViewSet):
     filterset_fields = ('name',)
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is None:
+            return super().list(request, *args, **kwargs)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'limit': 'Укажите целое число'}
+                )
+            limit = min(
+                max(limit, 1), settings.INGREDIENT_AUTOCOMPLETE_MAX_LIMIT
+            )
+        return Response(ingredient_index.search(name, limit))
+
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    cache_namespaces = ('tags',)
     filter_backends = (
         DjangoFilterBackend,
         filters.SearchFilter,
@@ -0,0 +1,53 @@
+import logging
+import queue
+import threading
+
+from django.db import close_old_connections
+
+logger = logging.getLogger('foodgram.workers')
+
+
+class WorkerPool:
+    def __init__(self, name, size, task):
+        self.name = name
+        self.size = size
+        self.task = task
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        with self.lock:
+            if self.threads:
+                return
+            for number in range(self.size):
+                thread = threading.Thread(
+                    target=self.work,
+                    name=f'{self.name}-worker-{number}',
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, *args):
+        if not self.size:
+            self.process(args)
+            return
+        self.start()
+        self.queue.put(args)
+
+    def process(self, args):
+        try:
+            self.task(*args)
+        except Exception:
+            logger.exception('%s task failed for %s', self.name, args)
+
+    def work(self):
+        while True:
+            args = self.queue.get()
+            close_old_connections()
+            try:
+                self.process(args)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
@@ -13,6 +13,8 @@ class UserAdmin(UserAdmin):
         'last_name',
         'bio',
         'role',
+        'recipes_count',
+        'followers_count',
     )
     search_fields = ('username',)
     list_filter = ('username', 'email')
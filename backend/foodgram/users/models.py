@@ -48,6 +48,12 @@ class User(AbstractUser):
         help_text='Укажите роль',
     )
     confirmation_code = models.CharField(max_length=32, blank=True)
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='Количество подписчиков'
+    )
 
     USERNAME_FIELD = 'email'
 
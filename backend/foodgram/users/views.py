@@ -1,16 +1,27 @@
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import BooleanField, F, Value, Window
+from django.db.models.functions import RowNumber
 from django.shortcuts import get_object_or_404
-from rest_framework import permissions, serializers, status, viewsets
+from rest_framework import (
+    mixins,
+    permissions,
+    serializers,
+    status,
+    viewsets,
+)
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
 from api.permissions import CreateUserOrAuthenticated
 from api.serializers import (
-    FollowSerializer,
+    SubscriptionSerializer,
     UserPasswordSerializer,
     UserSerializer,
 )
+from recipes.images import VARIANT_FIELDS
+from recipes.models import Recipe
+from recipes.relations import add_relation, remove_relation
 from users.models import Follow, User
 
 
@@ -27,22 +38,25 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def subscribe(self, request, pk):
         user = request.user
-        author = get_object_or_404(User, id=pk)
-        if not request.method == 'DELETE':
-            if user.follower.filter(author=author).exists():
+        if request.method == 'DELETE':
+            if not remove_relation(Follow, user, 'author_id', pk):
                 return Response(
-                    'Вы уже подписаны', status=status.HTTP_400_BAD_REQUEST
+                    'Вы не подписаны', status=status.HTTP_400_BAD_REQUEST
                 )
-            if not user == author:
-                instance = Follow.objects.create(user=user, author=author)
-                serializer = UserSerializer(author)
-                return Response(serializer.data)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        author = get_object_or_404(User, id=pk)
+        if user == author:
             return Response(
                 'Нельзя подписаться на самого себя',
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        user.follower.get(author=author).delete()
-        return Response('Успешная отписка', status=status.HTTP_200_OK)
+        if not add_relation(Follow, user, 'author_id', author.pk):
+            return Response(
+                'Вы уже подписаны', status=status.HTTP_400_BAD_REQUEST
+            )
+        author.is_subscribed = True
+        serializer = UserSerializer(author, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(
         detail=False,
@@ -60,7 +74,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 'Неправильный пароль', status=status.HTTP_400_BAD_REQUEST
             )
         user.set_password(data.get('new_password'))
-        user.save()
+        user.save(update_fields=('password',))
         return Response('Пароль изменен', status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'])
@@ -70,11 +84,76 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class FollowViewSet(viewsets.ModelViewSet):
-    serializer_class = FollowSerializer
+class FollowViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    serializer_class = SubscriptionSerializer
     pagination_class = PageNumberPagination
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_queryset(self):
-        user = self.request.user
-        return user.follower.all()
+        authors = User.objects.filter(following__user=self.request.user)
+        return authors.annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+
+    def get_recipes_limit(self):
+        limit = self.request.query_params.get('recipes_limit')
+        if limit is None:
+            return None
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise serializers.ValidationError(
+                {'recipes_limit': 'Укажите целое число'}
+            )
+        return max(limit, 0)
+
+    def paginate_queryset(self, queryset):
+        authors = super().paginate_queryset(queryset)
+        if authors is not None:
+            self.attach_latest_recipes(authors, self.get_recipes_limit())
+        return authors
+
+    def attach_latest_recipes(self, authors, limit):
+        recipes = (
+            Recipe.objects.filter(author__in=[author.pk for author in authors])
+            .order_by('-pub_date', '-id')
+            .only(
+                'id',
+                'author_id',
+                'name',
+                'image',
+                'cooking_time',
+                *VARIANT_FIELDS,
+            )
+        )
+        if limit is not None:
+            ranked = (
+                recipes.annotate(
+                    row_number=Window(
+                        expression=RowNumber(),
+                        partition_by=(F('author_id'),),
+                        order_by=(F('pub_date').desc(), F('id').desc()),
+                    )
+                )
+                .order_by()
+                .values(
+                    'id',
+                    'author_id',
+                    'name',
+                    'image',
+                    'cooking_time',
+                    *VARIANT_FIELDS,
+                    'row_number',
+                )
+            )
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) AS ranked '
+                'WHERE row_number <= %s ORDER BY author_id, row_number',
+                (*params, limit),
+            )
+        latest = {author.pk: [] for author in authors}
+        for recipe in recipes:
+            latest[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest[author.pk]